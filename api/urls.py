@@ -1,6 +1,6 @@
 from django.urls import path
 from visitors.views import UserApi,RegisterApi,LoginApi,LogoutApi,ProfileApi,EducationApi,send_otp
-from rankpredictor.views import AnswerSheetAPi,SlotsApi,predictRank,test
+from rankpredictor.views import AnswerSheetAPi,SlotsApi,predictRank,PredictRankJobApi,candidateResults,slotAnalytics,scorePercentile,batchScore,performanceMetrics,test
 
 
 urlpatterns = [
@@ -15,5 +15,11 @@ urlpatterns = [
     path('rankpredictor/slots/',SlotsApi.as_view()),
     path('rankpredictor/answersheet/',AnswerSheetAPi.as_view()),
     path('rankpredictor/getrank/',predictRank),
+    path('rankpredictor/getrank/jobs/',PredictRankJobApi.as_view()),
+    path('rankpredictor/results/',candidateResults),
+    path('rankpredictor/analytics/',slotAnalytics),
+    path('rankpredictor/percentile/',scorePercentile),
+    path('rankpredictor/batchscore/',batchScore),
+    path('rankpredictor/metrics/',performanceMetrics),
     path('test/',test),
 ]
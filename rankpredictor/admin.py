@@ -1,6 +1,11 @@
 from django.contrib import admin
-from .models import Slots,AnswerSheet,CandidateScore
+from .models import Slots,AnswerSheet,CandidateScore,CandidateResponse,BackgroundJob,ScoreStatistics,ScoreHistogram,DepartmentToppers
 # Register your models here.
 admin.site.register(Slots)
 admin.site.register(AnswerSheet)
-admin.site.register(CandidateScore)
\ No newline at end of file
+admin.site.register(CandidateScore)
+admin.site.register(CandidateResponse)
+admin.site.register(BackgroundJob)
+admin.site.register(ScoreStatistics)
+admin.site.register(ScoreHistogram)
+admin.site.register(DepartmentToppers)
\ No newline at end of file
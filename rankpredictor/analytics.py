@@ -0,0 +1,129 @@
+from collections import Counter
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from .models import CandidateResponse, SlotAnalytics
+from .answer_key import get_answer_key
+from .batch_scoring import VectorizedAnswerKey, TYPE_MCQ, TYPE_MSQ
+from .response_store import unpack_answers
+from .rescore import iter_chunks
+
+
+def build_slot_analytics(slot_id, chunk_size=None):
+    """
+    Per question statistics of a slot over every stored response sheet.
+
+    Responses are encoded and scored in chunks with the vectorized scorer
+    and only the column sums are kept: attempts, correct answers and marks
+    awarded per question, plus how often each option was picked for MCQ /
+    MSQ questions. Returns None when the slot has no answer key.
+    """
+    chunk_size = chunk_size or getattr(settings, 'RESCORE_CHUNK_SIZE', 1000)
+
+    answer_key = get_answer_key(slot_id)
+    if not answer_key:
+        return None
+    key = VectorizedAnswerKey(answer_key)
+
+    size = len(key)
+    candidates = 0
+    attempts = np.zeros(size, dtype=np.int64)
+    correct = np.zeros(size, dtype=np.int64)
+    awarded = np.zeros(size)
+    options = [Counter() for _ in range(size)]
+
+    responses = CandidateResponse.objects.filter(slot_id=slot_id)
+    for rows in iter_chunks(responses, ['answers'], chunk_size):
+        records = [unpack_answers(answers) for _, answers in rows]
+        batch = key.score(key.encode(records))
+
+        candidates += len(rows)
+        attempts += batch.attempted.sum(axis=0)
+        correct += batch.correct.sum(axis=0)
+        awarded += batch.awarded.sum(axis=0)
+
+        for sheet in records:
+            for record in sheet:
+                col = key.columns.get(int(record['question_Id']))
+                if col is None:
+                    continue
+                if key.type_codes[col] == TYPE_MCQ:
+                    options[col][record['candidate_answer']] += 1
+                elif key.type_codes[col] == TYPE_MSQ:
+                    options[col].update(set(record['candidate_answer']))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        attempt_rate = attempts / candidates if candidates else np.zeros(size)
+        accuracy = np.where(attempts > 0, correct / attempts, np.nan)
+        difficulty = 1 - correct / candidates if candidates else np.full(size, np.nan)
+        average_marks = awarded / candidates if candidates else np.zeros(size)
+
+    questions = []
+    for col, question in enumerate(key.questions):
+        correct_options = set()
+        if question.q_type == 'MCQ' and question.mcq_key is not None:
+            correct_options = {question.mcq_key}
+        elif question.q_type == 'MSQ':
+            correct_options = set(question.msq_options)
+
+        questions.append({
+            "question_no": question.question_no,
+            "question_Id": question.question_Id,
+            "q_type": question.q_type,
+            "mark": question.mark,
+            "attempts": int(attempts[col]),
+            "correct": int(correct[col]),
+            "attempt_rate": float(attempt_rate[col]),
+            "accuracy": None if np.isnan(accuracy[col]) else float(accuracy[col]),
+            "difficulty": None if np.isnan(difficulty[col]) else float(difficulty[col]),
+            "average_marks": float(average_marks[col]),
+            "options": [
+                {
+                    "option": option,
+                    "count": count,
+                    "is_correct": (option.lower() if question.q_type == 'MCQ' else option) in correct_options,
+                }
+                for option, count in options[col].most_common()
+            ],
+        })
+
+    return {
+        "slot_id": int(slot_id),
+        "candidates": candidates,
+        "questions": questions,
+    }
+
+
+def store_slot_analytics(slot_id):
+    """
+    Build a slot's analytics and store them as its SlotAnalytics snapshot.
+    Reads every stored response sheet of the slot, so it runs in background
+    jobs only. Returns the analytics, or None when the slot has no key.
+    """
+    analytics = build_slot_analytics(slot_id)
+    if analytics is None:
+        SlotAnalytics.objects.filter(slot_id=slot_id).delete()
+        return None
+
+    SlotAnalytics.objects.update_or_create(
+        slot_id=slot_id,
+        defaults={"candidates": analytics["candidates"], "questions": analytics["questions"]},
+    )
+    return analytics
+
+
+def get_slot_analytics(slot_id):
+    """
+    The stored SlotAnalytics snapshot of a slot, or None when none was built yet.
+    """
+    return SlotAnalytics.objects.filter(slot_id=slot_id).first()
+
+
+def analytics_outdated(snapshot):
+    """
+    True when a snapshot is missing or older than ANALYTICS_CACHE_TTL
+    seconds, and reading it should queue a rebuild.
+    """
+    max_age = timedelta(seconds=getattr(settings, 'ANALYTICS_CACHE_TTL', 5 * 60))
+    return snapshot is None or timezone.now() - snapshot.built_at > max_age
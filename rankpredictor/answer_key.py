@@ -0,0 +1,198 @@
+import ast
+import threading
+import time
+from django.conf import settings
+from .models import AnswerSheet
+from .db_router import use_primary
+
+
+class CompiledQuestion:
+    """
+    One answer key row with its answer pre-parsed for the question type,
+    so scoring a response never has to re-parse the stored string.
+    """
+    __slots__ = ('question_Id', 'question_no', 'q_type', 'mark', 'correct_answer',
+                 'is_mta', 'mcq_key', 'msq_options', 'nat_ranges')
+
+    def __init__(self, question_Id, question_no, answer, q_type, mark):
+        self.question_Id = question_Id
+        self.question_no = question_no
+        self.q_type = q_type
+        self.mark = mark
+        self.correct_answer = answer.strip()
+        self.is_mta = self.correct_answer == 'MTA'  # Free marks if attempted
+        self.mcq_key = None
+        self.msq_options = None
+        self.nat_ranges = None
+
+        if q_type == 'MCQ':
+            self.mcq_key = self.correct_answer.lower()
+        elif q_type == 'MSQ':
+            self.msq_options = parse_msq_answer(self.correct_answer)
+        elif q_type == 'NAT':
+            self.nat_ranges = parse_nat_answer(self.correct_answer)
+
+
+def parse_msq_answer(correct_answer):
+    """
+    MSQ answers are stored as the repr of a list, e.g. "['a.png', 'b.png']".
+    Fall back to a plain comma split for rows that were entered by hand.
+    """
+    try:
+        return frozenset(ast.literal_eval(correct_answer))
+    except (SyntaxError, ValueError, TypeError):
+        return frozenset(correct_answer.strip("[]").split(","))
+
+
+def parse_nat_answer(correct_answer):
+    """
+    Convert a NAT answer like '3.99 OR 2 to 4' into a tuple of (low, high)
+    intervals. A single value becomes a zero width interval.
+
+    Scoring checks the intervals in order and treats an unparsable part as a
+    wrong answer, so parsing stops at the first bad part: every interval that
+    could still match is kept and nothing after it could have been reached.
+    """
+    ranges = []
+    for range_str in correct_answer.replace(" ", "").split('OR'):
+        range_str = range_str.strip()
+        try:
+            if 'to' in range_str:
+                lower_bound, upper_bound = map(float, range_str.split('to'))
+            else:
+                lower_bound = upper_bound = float(range_str)
+        except ValueError:
+            break
+        ranges.append((lower_bound, upper_bound))
+    return tuple(ranges)
+
+
+class CompiledAnswerKey:
+    """
+    In-memory answer key for a slot, keyed by question_Id.
+    Scoring against it is a pure Python pass with no database access.
+    """
+
+    def __init__(self, slot_id, rows):
+        self.slot_id = slot_id
+        self.questions = {}
+        for question_Id, question_no, answer, q_type, mark in rows:
+            self.questions[question_Id] = CompiledQuestion(question_Id, question_no, answer, q_type, mark)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __bool__(self):
+        return bool(self.questions)
+
+    def evaluate(self, question, candidate_answer):
+        """
+        Return (is_correct, marks_awarded) for one attempted question.
+        A malformed answer (None, a number for an MCQ, ...) is a wrong answer.
+        """
+        is_correct = False
+        marks_awarded = 0
+        mark = question.mark
+
+        if question.is_mta:
+            is_correct = True
+            marks_awarded = mark
+        elif question.q_type == 'MCQ':  # Single correct option (Case insensitive)
+            is_correct = isinstance(candidate_answer, str) and candidate_answer.lower() == question.mcq_key
+            marks_awarded = mark if is_correct else - (mark / 3)  # Deduct 1/3 for incorrect answer
+        elif question.q_type == 'MSQ':  # Exact match of the option set required
+            try:
+                is_correct = question.msq_options == set(candidate_answer)
+            except TypeError:
+                is_correct = False
+            marks_awarded = mark if is_correct else 0
+        elif question.q_type == 'NAT':  # Numeric answer type (No negative marking)
+            try:
+                candidate_answer_float = float(candidate_answer)
+                for lower_bound, upper_bound in question.nat_ranges:
+                    if lower_bound <= candidate_answer_float <= upper_bound:
+                        is_correct = True
+                        break
+            except (TypeError, ValueError):
+                is_correct = False
+            marks_awarded = mark if is_correct else 0
+
+        return is_correct, marks_awarded
+
+    def score(self, scraped_data):
+        """
+        Score a candidate response list as returned by get_candidate_response.
+        Returns (total_marks, detailed_results).
+        """
+        total_marks = 0
+        detailed_results = []
+
+        for user_response in scraped_data:
+            question_Id = int(user_response['question_Id'])
+            candidate_answer = user_response['candidate_answer']
+            question = self.questions.get(question_Id)
+            if question is None:
+                continue
+
+            is_correct, marks_awarded = self.evaluate(question, candidate_answer)
+            total_marks += marks_awarded
+
+            detailed_results.append({
+                "question_no": question.question_no,
+                "question_Id": question_Id,
+                "user_answer": candidate_answer,
+                "correct_answer": question.correct_answer,
+                "is_correct": is_correct,
+                "marks_awarded": marks_awarded
+            })
+
+        return total_marks, detailed_results
+
+
+# Process level cache of compiled keys: {slot_id: (compiled_at, CompiledAnswerKey)}
+_answer_key_cache = {}
+_answer_key_lock = threading.Lock()
+
+
+@use_primary()
+def load_answer_key(slot_id):
+    """
+    Build a CompiledAnswerKey for a slot straight from the database. Keys
+    are reloaded right after an upload, so never from a lagging replica.
+    """
+    rows = AnswerSheet.objects.filter(slot_id=slot_id).values_list(
+        'question_Id', 'question_no', 'answer', 'q_type', 'mark'
+    )
+    return CompiledAnswerKey(slot_id, rows)
+
+
+def get_answer_key(slot_id):
+    """
+    Return the compiled answer key for a slot, compiling it on first use.
+
+    Keys are invalidated explicitly when an answer sheet is uploaded. Other
+    worker processes do not see that invalidation, so entries also expire
+    after ANSWER_KEY_CACHE_TTL seconds.
+    """
+    ttl = getattr(settings, 'ANSWER_KEY_CACHE_TTL', 60)
+    now = time.monotonic()
+
+    entry = _answer_key_cache.get(slot_id)
+    if entry is not None and now - entry[0] < ttl:
+        return entry[1]
+
+    answer_key = load_answer_key(slot_id)
+    with _answer_key_lock:
+        _answer_key_cache[slot_id] = (now, answer_key)
+    return answer_key
+
+
+def invalidate_answer_key(slot_id=None):
+    """
+    Drop the cached key for a slot, or every cached key when slot_id is None.
+    """
+    with _answer_key_lock:
+        if slot_id is None:
+            _answer_key_cache.clear()
+        else:
+            _answer_key_cache.pop(int(slot_id), None)
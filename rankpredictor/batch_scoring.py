@@ -0,0 +1,200 @@
+import numpy as np
+
+
+# Question type codes used in the encoded key
+TYPE_OTHER = 0
+TYPE_MCQ = 1
+TYPE_MSQ = 2
+TYPE_NAT = 3
+TYPE_MTA = 4
+
+TYPE_CODES = {
+    'MCQ': TYPE_MCQ,
+    'MSQ': TYPE_MSQ,
+    'NAT': TYPE_NAT,
+}
+
+# Candidate answers that are not a known MCQ option / MSQ option
+UNKNOWN_OPTION = -2
+FOREIGN_OPTION_BIT = 1 << 63
+
+
+class VectorizedAnswerKey:
+    """
+    Array encoding of a CompiledAnswerKey, one column per question ordered by
+    question_no, so a whole batch of response sheets is scored with NumPy.
+    """
+
+    def __init__(self, answer_key):
+        questions = sorted(
+            answer_key.questions.values(),
+            key=lambda q: (q.question_no is None, q.question_no or 0, q.question_Id)
+        )
+        self.answer_key = answer_key
+        self.questions = questions
+        self.columns = {q.question_Id: idx for idx, q in enumerate(questions)}
+
+        size = len(questions)
+        self.question_ids = np.array([q.question_Id for q in questions], dtype=np.uint64)
+        self.question_nos = [q.question_no for q in questions]
+        self.type_codes = np.zeros(size, dtype=np.int8)
+        self.marks = np.array([q.mark for q in questions], dtype=np.float64)
+
+        # MCQ: every distinct lowercase option gets an id shared by key and responses
+        self.mcq_vocab = {}
+        self.mcq_key_ids = np.full(size, -1, dtype=np.int64)
+
+        # MSQ: each question maps its correct options to bits of a mask
+        self.msq_vocab = [None] * size
+        self.msq_key_masks = np.zeros(size, dtype=np.uint64)
+
+        # NAT: intervals padded with NaN, which never compare true
+        width = max([len(q.nat_ranges) for q in questions if q.nat_ranges] or [1])
+        self.nat_low = np.full((size, width), np.nan)
+        self.nat_high = np.full((size, width), np.nan)
+
+        for idx, question in enumerate(questions):
+            if question.is_mta:
+                self.type_codes[idx] = TYPE_MTA
+                continue
+            self.type_codes[idx] = TYPE_CODES.get(question.q_type, TYPE_OTHER)
+
+            if question.q_type == 'MCQ':
+                self.mcq_key_ids[idx] = self.mcq_vocab.setdefault(question.mcq_key, len(self.mcq_vocab))
+            elif question.q_type == 'MSQ':
+                if len(question.msq_options) > 63:
+                    raise ValueError(f"Question {question.question_Id} has too many MSQ options to encode.")
+                vocab = {option: 1 << bit for bit, option in enumerate(question.msq_options)}
+                self.msq_vocab[idx] = vocab
+                self.msq_key_masks[idx] = sum(vocab.values())
+            elif question.q_type == 'NAT':
+                for k, (lower_bound, upper_bound) in enumerate(question.nat_ranges):
+                    self.nat_low[idx, k] = lower_bound
+                    self.nat_high[idx, k] = upper_bound
+
+    def __len__(self):
+        return len(self.questions)
+
+    def encode(self, responses):
+        """
+        Encode a list of scraped response lists (one per candidate) into the
+        N x Q response matrices used by score().
+        """
+        n, size = len(responses), len(self.questions)
+        encoded = EncodedResponses(n, size)
+
+        for row, scraped_data in enumerate(responses):
+            for user_response in scraped_data:
+                col = self.columns.get(int(user_response['question_Id']))
+                if col is None:
+                    continue
+                candidate_answer = user_response['candidate_answer']
+
+                if encoded.attempted[row, col]:
+                    # A repeated question is scored again, like the per-request loop does
+                    is_correct, marks_awarded = self.answer_key.evaluate(self.questions[col], candidate_answer)
+                    encoded.extra_marks[row] += marks_awarded
+                    continue
+                encoded.attempted[row, col] = True
+
+                type_code = self.type_codes[col]
+                # Malformed answers are wrong answers, as in CompiledAnswerKey.evaluate
+                if type_code == TYPE_MCQ:
+                    if isinstance(candidate_answer, str):
+                        encoded.mcq_ids[row, col] = self.mcq_vocab.get(candidate_answer.lower(), UNKNOWN_OPTION)
+                elif type_code == TYPE_MSQ:
+                    vocab = self.msq_vocab[col]
+                    try:
+                        options = set(candidate_answer)
+                    except TypeError:
+                        options = {None}
+                    mask = 0
+                    for option in options:
+                        mask |= vocab.get(option, FOREIGN_OPTION_BIT)
+                    encoded.msq_masks[row, col] = mask
+                elif type_code == TYPE_NAT:
+                    try:
+                        encoded.nat_values[row, col] = float(candidate_answer)
+                    except (TypeError, ValueError):
+                        pass
+
+        return encoded
+
+    def score(self, encoded):
+        """
+        Score encoded responses in one vectorized pass.
+        Returns a BatchScore with per-candidate totals and per-question results.
+        """
+        attempted = encoded.attempted
+        type_codes = self.type_codes[np.newaxis, :]
+
+        is_mcq = type_codes == TYPE_MCQ
+        mcq_correct = is_mcq & (encoded.mcq_ids == self.mcq_key_ids[np.newaxis, :])
+        msq_correct = (type_codes == TYPE_MSQ) & (encoded.msq_masks == self.msq_key_masks[np.newaxis, :])
+
+        values = encoded.nat_values[:, :, np.newaxis]
+        with np.errstate(invalid='ignore'):
+            in_range = (self.nat_low[np.newaxis] <= values) & (values <= self.nat_high[np.newaxis])
+        nat_correct = (type_codes == TYPE_NAT) & in_range.any(axis=2)
+
+        correct = attempted & (mcq_correct | msq_correct | nat_correct | (type_codes == TYPE_MTA))
+
+        marks = np.broadcast_to(self.marks, attempted.shape)
+        awarded = np.where(correct, marks, 0.0)
+        awarded = np.where(attempted & is_mcq & ~correct, -(marks / 3), awarded)  # Deduct 1/3 for incorrect MCQ
+
+        # cumsum adds column by column, the same order the per-request loop uses
+        if awarded.shape[1]:
+            totals = np.cumsum(awarded, axis=1)[:, -1] + encoded.extra_marks
+        else:
+            totals = encoded.extra_marks.copy()
+
+        return BatchScore(self, attempted, correct, awarded, totals)
+
+
+class EncodedResponses:
+    """
+    N x Q matrices holding a batch of candidate responses.
+    """
+
+    def __init__(self, n, size):
+        self.attempted = np.zeros((n, size), dtype=bool)
+        self.mcq_ids = np.full((n, size), UNKNOWN_OPTION, dtype=np.int64)
+        self.msq_masks = np.zeros((n, size), dtype=np.uint64)
+        self.nat_values = np.full((n, size), np.nan)
+        self.extra_marks = np.zeros(n)
+
+
+class BatchScore:
+    """
+    Result of VectorizedAnswerKey.score().
+    """
+
+    def __init__(self, key, attempted, correct, awarded, totals):
+        self.key = key
+        self.attempted = attempted
+        self.correct = correct
+        self.awarded = awarded
+        self.totals = totals
+
+    def question_results(self, row):
+        """
+        Per-question correctness for one candidate, in question_no order.
+        """
+        results = []
+        for col in np.flatnonzero(self.attempted[row]):
+            results.append({
+                "question_no": self.key.question_nos[col],
+                "question_Id": int(self.key.question_ids[col]),
+                "is_correct": bool(self.correct[row, col]),
+                "marks_awarded": float(self.awarded[row, col])
+            })
+        return results
+
+
+def score_batch(answer_key, responses):
+    """
+    Score many scraped response lists against a compiled answer key.
+    """
+    vectorized_key = VectorizedAnswerKey(answer_key)
+    return vectorized_key.score(vectorized_key.encode(responses))
@@ -12,3 +12,26 @@ SHIFT_CHOICE = [
     ('FORENOON', 'FORENOON'),
     ('AFTERNOON', 'AFTERNOON'),
 ]
+
+JOB_KIND_CHOICE = [
+    ('PREDICT', 'PREDICT'),
+    ('RESCORE', 'RESCORE'),
+    ('ANALYTICS', 'ANALYTICS'),
+]
+
+JOB_STATUS_CHOICE = [
+    ('PENDING', 'PENDING'),
+    ('RUNNING', 'RUNNING'),
+    ('SUCCESS', 'SUCCESS'),
+    ('FAILED', 'FAILED'),
+]
+
+STATISTICS_SCOPE_CHOICE = [
+    ('SLOT', 'SLOT'),
+    ('DEPARTMENT', 'DEPARTMENT'),
+]
+
+HISTOGRAM_FIELD_CHOICE = [
+    ('MARKS', 'MARKS'),
+    ('NORMALIZED', 'NORMALIZED'),
+]
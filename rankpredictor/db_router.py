@@ -0,0 +1,57 @@
+import contextvars
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_primary_pinned = contextvars.ContextVar('rankpredictor_primary_pinned', default=False)
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary database inside the block (also usable as a
+    decorator). For code that writes and reads back what it wrote, which a
+    lagging replica may not have yet.
+    """
+    token = _primary_pinned.set(True)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(token)
+
+
+def get_replica_alias():
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+
+class ReplicaRouter:
+    """
+    Send reads of rankpredictor models to the REPLICA_DATABASE alias.
+
+    Writes always go to default, and so do reads under use_primary() or
+    inside a transaction on default. Other apps (auth, tokens, sessions)
+    are left to Django's default routing. Without a replica configured the
+    router does nothing.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = get_replica_alias()
+        if not replica or model._meta.app_label != 'rankpredictor':
+            return None
+        if _primary_pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        # Without this an instance read from the replica would be saved back to it
+        if get_replica_alias() and model._meta.app_label == 'rankpredictor':
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, get_replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
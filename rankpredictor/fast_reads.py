@@ -0,0 +1,60 @@
+import json
+from .models import Slots, AnswerSheet
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder gives the same bytes
+    orjson = None
+
+
+def dumps_json(payload):
+    """
+    Encode a payload to JSON bytes the way DRF's JSONRenderer does (compact,
+    UTF-8), with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+
+# Field order of AnswerSheetSerializer: pk, declared fields, then model fields
+ANSWER_SHEET_COLUMNS = ('id', 'mark', 'question_Id', 'question_no', 'answer', 'q_type')
+
+
+def render_answer_sheets(slot_id):
+    """
+    The AnswerSheetAPi.get payload for a slot as JSON bytes, built from
+    values_list() tuples instead of model instances and the serializer.
+    Returns (status_code, body).
+    """
+    rows = list(AnswerSheet.objects.filter(slot=slot_id).order_by('question_no').values_list(*ANSWER_SHEET_COLUMNS))
+    slot = Slots.objects.filter(id=slot_id).values_list('department', 'status').first() if rows else None
+
+    if slot is None:
+        return 404, dumps_json({
+            "status": 404,
+            "message": "No Data Found",
+            "error": 'No data found for the given slot',
+            "success": False
+        })
+
+    # The serializer renders slot as str(slot)
+    slot = f'{slot[0]}-{slot[1]}'
+
+    return 200, dumps_json({
+        "status": 200,
+        "message": "Data fetched successfully",
+        "data": [
+            {
+                "id": answer_sheet_id,
+                "mark": float(mark),
+                "slot": slot,
+                "question_Id": question_Id,
+                "question_no": question_no,
+                "answer": answer,
+                "q_type": q_type,
+            }
+            for answer_sheet_id, mark, question_Id, question_no, answer, q_type in rows
+        ],
+        "success": True
+    })
@@ -0,0 +1,108 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from .instrumentation import span
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the process wide requests session used for response sheets.
+    It keeps connections to the sheet CDN alive and retries failed GETs
+    with exponential backoff.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=getattr(settings, 'SHEET_FETCH_RETRIES', 3),
+                    backoff_factor=getattr(settings, 'SHEET_FETCH_BACKOFF', 0.5),
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET', 'HEAD']),
+                    raise_on_status=False,
+                )
+                pool_size = getattr(settings, 'SHEET_FETCH_POOL_SIZE', 20)
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def get_timeout():
+    return (
+        getattr(settings, 'SHEET_FETCH_CONNECT_TIMEOUT', 5),
+        getattr(settings, 'SHEET_FETCH_READ_TIMEOUT', 20),
+    )
+
+
+def is_sheet_url(url):
+    """
+    True for an https url on one of the SHEET_URL_HOSTS, the only urls
+    fetched on behalf of batch requests.
+    """
+    if not isinstance(url, str):
+        return False
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return False
+    hosts = getattr(settings, 'SHEET_URL_HOSTS', ['cdn.digialm.com'])
+    return parts.scheme == 'https' and parts.hostname in hosts and port in (None, 443)
+
+
+def fetch_sheet(url, headers=None):
+    """
+    GET a response sheet through the shared session.
+    Raises requests.HTTPError for error responses.
+    """
+    with span('fetch'):
+        response = get_session().get(url, headers=headers, timeout=get_timeout())
+    response.raise_for_status()
+    return response
+
+
+def map_concurrently(func, items):
+    """
+    Call func on every item with at most SHEET_FETCH_CONCURRENCY calls in
+    flight. Returns the results in input order; a call that raised leaves
+    its exception in place of the result.
+
+    Calls run in a copy of the caller's context, so their spans count
+    towards the caller's request timings.
+    """
+    items = list(items)
+    if not items:
+        return []
+    context = contextvars.copy_context()
+
+    def call(item):
+        try:
+            # A context can only be entered by one thread at a time
+            return context.copy().run(func, item)
+        except Exception as e:
+            return e
+
+    workers = min(getattr(settings, 'SHEET_FETCH_CONCURRENCY', 10), len(items))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(call, items))
+
+
+def fetch_sheets(urls):
+    """
+    Fetch many sheets concurrently, see map_concurrently.
+    """
+    return map_concurrently(fetch_sheet, urls)
+
@@ -0,0 +1,149 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Bucket upper bounds: milliseconds for durations, plain counts for queries
+DURATION_BOUNDS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+COUNT_BOUNDS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    """
+    Counts of observed values per bucket, with their count / sum / max.
+    Percentiles are estimated by interpolating inside a bucket.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)  # last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = len(self.bounds)
+        for position, bound in enumerate(self.bounds):
+            if value <= bound:
+                index = position
+                break
+        with self.lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            if count and seen + count >= target:
+                low = self.bounds[index - 1] if index > 0 else 0
+                high = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(low + (high - low) * (target - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "sum": self.total,
+                "mean": self.total / self.count if self.count else None,
+                "max": self.max,
+                "p50": self.percentile(0.5),
+                "p95": self.percentile(0.95),
+                "p99": self.percentile(0.99),
+                "buckets": [
+                    [bound, count]
+                    for bound, count in zip(list(self.bounds) + ['+Inf'], self.buckets)
+                ],
+            }
+
+
+# Process level metrics: {name: Histogram}. Every worker process keeps its own.
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(name, value, bounds=DURATION_BOUNDS):
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, Histogram(bounds))
+    histogram.observe(value)
+
+
+def get_metrics():
+    with _histograms_lock:
+        histograms = dict(_histograms)
+    return {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+
+
+def reset_metrics():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+class RequestTimings:
+    """
+    What one request spent: named spans and database queries, in milliseconds.
+    """
+
+    def __init__(self):
+        self.spans = []  # [(name, ms)] in completion order, also appended to from map_concurrently workers
+        self.queries = 0
+        self.query_time = 0.0
+
+    def span_totals(self):
+        """
+        [(name, total ms, count)] per span name, in order of first completion.
+        """
+        totals = {}
+        for name, elapsed in list(self.spans):
+            total, count = totals.get(name, (0.0, 0))
+            totals[name] = (total + elapsed, count + 1)
+        return [(name, total, count) for name, (total, count) in totals.items()]
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook, counts every query of the request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += (time.perf_counter() - start) * 1000
+
+
+_current_timings = contextvars.ContextVar('rankpredictor_request_timings', default=None)
+
+
+def start_request_timings():
+    timings = RequestTimings()
+    return timings, _current_timings.set(timings)
+
+
+def end_request_timings(token):
+    _current_timings.reset(token)
+
+
+@contextmanager
+def span(name):
+    """
+    Time a named stage (also usable as a decorator). The duration goes into
+    the `stage.<name>` histogram and, inside a request, its Server-Timing
+    header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        observe(f'stage.{name}', elapsed)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.spans.append((name, elapsed))
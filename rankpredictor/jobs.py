@@ -0,0 +1,149 @@
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .models import BackgroundJob
+from .pipeline import run_prediction
+from .rescore import rescore_slot
+from .analytics import store_slot_analytics
+from .db_router import use_primary
+
+logger = logging.getLogger(__name__)
+
+
+def run_predict_job(job):
+    """
+    Run the predictRank pipeline for a queued job.
+    Returns (succeeded, result).
+    """
+    payload = job.payload
+    status_code, result = run_prediction(
+        job.user,
+        payload.get('url'),
+        payload.get('department'),
+        payload.get('shift'),
+    )
+    return status_code < 400, result
+
+
+def run_rescore_job(job):
+    """
+    Re-score every stored candidate of a slot after its answer key changed.
+    """
+    def report(stage, done, total):
+        BackgroundJob.objects.filter(id=job.id).update(progress={"stage": stage, "done": done, "total": total})
+
+    summary = rescore_slot(job.payload.get('slot_id'), report=report)
+    # Every stored sheet was just scored again, the analytics change with them
+    report('analytics', 0, 1)
+    store_slot_analytics(summary["slot_id"])
+    return True, summary
+
+
+def run_analytics_job(job):
+    """
+    Rebuild the stored question analytics of a slot.
+    """
+    analytics = store_slot_analytics(job.payload.get('slot_id'))
+    if analytics is None:
+        return False, {"error": "No answer key found for the given slot"}
+    return True, {"slot_id": analytics["slot_id"], "candidates": analytics["candidates"]}
+
+
+JOB_HANDLERS = {
+    'PREDICT': run_predict_job,
+    'RESCORE': run_rescore_job,
+    'ANALYTICS': run_analytics_job,
+}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'JOB_WORKERS', 4),
+                    thread_name_prefix='rankpredictor-job',
+                )
+    return _executor
+
+
+def enqueue_job(kind, payload, user=None):
+    """
+    Store a job and schedule it.
+
+    With JOB_QUEUE_BACKEND = 'thread' the job runs on this process' worker
+    pool once the surrounding transaction commits. With 'db' it stays
+    PENDING until a `manage.py run_jobs` worker claims it.
+    """
+    job = BackgroundJob.objects.create(kind=kind, payload=payload, user=user)
+    if getattr(settings, 'JOB_QUEUE_BACKEND', 'thread') == 'thread':
+        transaction.on_commit(lambda: get_executor().submit(run_job, job.id))
+    return job
+
+
+@use_primary()
+def schedule_slot_analytics(slot_id):
+    """
+    Queue a rebuild of a slot's stored analytics, unless one is already
+    waiting. Returns the job.
+    """
+    slot_id = int(slot_id)
+    pending = BackgroundJob.objects.filter(kind='ANALYTICS', status='PENDING', payload__slot_id=slot_id).first()
+    return pending or enqueue_job('ANALYTICS', {"slot_id": slot_id})
+
+
+@use_primary()
+def claim_job(job_id):
+    """
+    Move a job from PENDING to RUNNING. Returns False when another worker
+    already took it.
+    """
+    return BackgroundJob.objects.filter(id=job_id, status='PENDING').update(
+        status='RUNNING', started_at=timezone.now()
+    ) == 1
+
+
+@use_primary()
+def run_job(job_id):
+    """
+    Claim and run one job, storing its result or error on the row. Reads go
+    to the primary: the row was just claimed there and a lagging replica
+    may not have it yet.
+    """
+    # Worker threads are not request scoped: drop expired or broken connections
+    # before and after a job, like Django does around every request
+    close_old_connections()
+    try:
+        if not claim_job(job_id):
+            return
+
+        job = BackgroundJob.objects.select_related('user').get(id=job_id)
+        try:
+            succeeded, result = JOB_HANDLERS[job.kind](job)
+            job.status = 'SUCCESS' if succeeded else 'FAILED'
+            job.result = result
+        except Exception as e:
+            logger.exception(f"Background job {job_id} failed")
+            job.status = 'FAILED'
+            job.error = f"{e}\n{traceback.format_exc()}"
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+    finally:
+        close_old_connections()
+
+
+@use_primary()
+def pending_job_ids(limit):
+    return list(
+        BackgroundJob.objects.filter(status='PENDING').order_by('created_at').values_list('id', flat=True)[:limit]
+    )
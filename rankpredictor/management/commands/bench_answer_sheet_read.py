@@ -0,0 +1,64 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rankpredictor import fast_reads
+from rankpredictor.models import Slots
+from rankpredictor.views import AnswerSheetAPi
+
+
+class Command(BaseCommand):
+    help = "Benchmark the values_list answer sheet read path against the serializer path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('slot_ids', nargs='*', type=int, help="Slots to read (default: every slot)")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per slot and path (best run is kept)")
+
+    def handle(self, *args, **options):
+        slot_ids = options['slot_ids'] or list(Slots.objects.order_by('id').values_list('id', flat=True))
+        if not slot_ids:
+            raise CommandError("No slots found")
+
+        repeat = max(1, options['repeat'])
+        view = AnswerSheetAPi()
+        total_serializer = total_fast = 0
+        mismatches = []
+
+        self.stdout.write(f"JSON encoder: {'orjson' if fast_reads.orjson is not None else 'json'}")
+
+        for slot_id in slot_ids:
+            serializer_time, serializer_body = self.best_of(lambda: self.serializer_path(view, slot_id), repeat)
+            fast_time, fast_body = self.best_of(lambda: fast_reads.render_answer_sheets(slot_id), repeat)
+            total_serializer += serializer_time
+            total_fast += fast_time
+
+            same = serializer_body == fast_body
+            if not same:
+                mismatches.append(str(slot_id))
+
+            self.stdout.write(
+                f"slot {slot_id}: {len(fast_body[1]) / 1024:.1f} KiB, "
+                f"serializer {serializer_time * 1000:.2f} ms, values_list {fast_time * 1000:.2f} ms, "
+                f"x{serializer_time / fast_time:.1f}{'' if same else ' OUTPUT DIFFERS'}"
+            )
+
+        self.stdout.write(
+            f"\n{len(slot_ids)} slots: serializer {total_serializer * 1000:.1f} ms, "
+            f"values_list {total_fast * 1000:.1f} ms, speedup x{total_serializer / total_fast:.1f}"
+        )
+
+        if mismatches:
+            raise CommandError(f"Read paths disagree on slot(s): {', '.join(mismatches)}")
+
+    def serializer_path(self, view, slot_id):
+        status_code, payload = view.build_answer_sheets(slot_id)
+        return status_code, JSONRenderer().render(payload)
+
+    def best_of(self, read, repeat):
+        best = None
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = read()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
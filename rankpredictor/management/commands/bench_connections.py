@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.core.signals import request_started, request_finished
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from rankpredictor.models import Slots
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate requests (request_started, one query, request_finished) with a new "
+        "connection per request and with the configured connection settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Simulated requests per worker thread")
+        parser.add_argument('--threads', type=int, default=1, help="Worker threads, each with its own connection")
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        configured = settings_dict['CONN_MAX_AGE']
+        pooled = 'pool' in settings_dict.get('OPTIONS', {})
+        requests = max(1, options['requests'])
+        threads = max(1, options['threads'])
+
+        self.stdout.write(
+            f"{connection.vendor}: CONN_MAX_AGE={configured}, CONN_HEALTH_CHECKS={settings_dict['CONN_HEALTH_CHECKS']}, "
+            f"pool={'on' if pooled else 'off'}, {threads} thread(s) x {requests} requests"
+        )
+
+        modes = [('connection per request', 0, False)]
+        if pooled:
+            modes.append(('pool', 0, True))
+        else:
+            modes.append((f'persistent (CONN_MAX_AGE={configured})', configured, False))
+
+        for name, max_age, keep_pool in modes:
+            opened, latencies = self.run(requests, threads, max_age, keep_pool)
+            latencies.sort()
+            total = len(latencies)
+            self.stdout.write(
+                f"{name}: {opened} connection(s) opened for {total} requests, "
+                f"mean {sum(latencies) / total * 1000:.3f} ms, "
+                f"p50 {latencies[total // 2] * 1000:.3f} ms, "
+                f"p99 {latencies[min(total - 1, int(total * 0.99))] * 1000:.3f} ms"
+            )
+
+    def run(self, requests, threads, max_age, keep_pool):
+        """
+        Returns (connections opened, request latencies). With a pool,
+        connection_created fires on every checkout from it.
+        """
+        # The connection of every thread reads this same dict
+        settings_dict = connection.settings_dict
+        options = settings_dict.setdefault('OPTIONS', {})
+        saved_max_age, saved_pool = settings_dict['CONN_MAX_AGE'], options.get('pool')
+        settings_dict['CONN_MAX_AGE'] = max_age
+        if not keep_pool:
+            options.pop('pool', None)
+
+        opened = [0]
+        lock = threading.Lock()
+
+        def count_connection(sender, **kwargs):
+            with lock:
+                opened[0] += 1
+
+        def worker():
+            latencies = []
+            try:
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    request_started.send(sender=self.__class__)
+                    Slots.objects.exists()
+                    request_finished.send(sender=self.__class__)
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                connections.close_all()
+            return latencies
+
+        connections.close_all()
+        connection_created.connect(count_connection)
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                results = [executor.submit(worker) for _ in range(threads)]
+                latencies = [latency for result in results for latency in result.result()]
+        finally:
+            connection_created.disconnect(count_connection)
+            settings_dict['CONN_MAX_AGE'] = saved_max_age
+            if saved_pool is not None:
+                options['pool'] = saved_pool
+        return opened[0], latencies
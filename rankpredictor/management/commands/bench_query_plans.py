@@ -0,0 +1,94 @@
+import re
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Avg, Count, Max, Min
+from rankpredictor.models import Slots, AnswerSheet, CandidateScore
+
+
+# Plan lines that mean the whole table is read or the rows are sorted after reading
+FULL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (?!.*USING (COVERING )?INDEX)'),
+    'postgresql': re.compile(r'Seq Scan'),
+}
+EXTRA_SORT = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'^\s*(->\s*)?(Incremental )?Sort\b', re.MULTILINE),
+}
+
+
+class Command(BaseCommand):
+    help = "Print the query plans and timings of the hot CandidateScore / AnswerSheet queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query (best run is kept)")
+        parser.add_argument('--analyze', action='store_true', help="EXPLAIN ANALYZE on PostgreSQL")
+        parser.add_argument('--strict', action='store_true', help="Fail when a query still scans the table or sorts")
+
+    def handle(self, *args, **options):
+        slot = Slots.objects.filter(candidatescore__isnull=False).order_by('id').first()
+        if slot is None:
+            raise CommandError("No scored candidates found")
+        candidate = CandidateScore.objects.filter(slot=slot, rank_low__isnull=False).order_by('id').first() \
+            or CandidateScore.objects.filter(slot=slot).order_by('id').first()
+
+        vendor = connection.vendor
+        explain_options = {'analyze': True} if options['analyze'] and vendor == 'postgresql' else {}
+        repeat = max(1, options['repeat'])
+        slow = []
+
+        self.stdout.write(
+            f"{vendor}: {CandidateScore.objects.count()} scores, slot {slot.id} ({slot.department}), "
+            f"{AnswerSheet.objects.filter(slot=slot).count()} answer key rows\n"
+        )
+
+        for name, queryset, run in self.queries(slot, candidate):
+            plan = queryset.explain(**explain_options)
+            elapsed = self.best_of(run, repeat)
+
+            problems = []
+            if vendor in FULL_SCAN and FULL_SCAN[vendor].search(plan):
+                problems.append('full scan')
+            if vendor in EXTRA_SORT and EXTRA_SORT[vendor].search(plan):
+                problems.append('sort')
+            if problems:
+                slow.append(name)
+
+            self.stdout.write(f"{name}: {elapsed * 1000:.2f} ms{' (' + ', '.join(problems) + ')' if problems else ''}")
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+
+        if slow and options['strict']:
+            raise CommandError(f"Not served by an index: {', '.join(slow)}")
+
+    def queries(self, slot, candidate):
+        """
+        (name, queryset to explain, callable to time) for each hot path.
+        """
+        department = CandidateScore.objects.filter(department=slot.department)
+        toppers = department.filter(normalized_marks__isnull=False).order_by('-normalized_marks').values_list('normalized_marks', 'id')[:50]
+        department_marks = department.values_list('normalized_marks')
+        slot_marks = CandidateScore.objects.filter(slot=slot).values_list('marks_obtained')
+        rank_ahead = CandidateScore.objects.filter(
+            rank_low=candidate.rank_low, rank_high=candidate.rank_high, normalized_marks__gt=candidate.normalized_marks or 0
+        )
+        answer_key = AnswerSheet.objects.filter(slot=slot).order_by('question_no').values_list('question_Id', 'question_no', 'answer', 'q_type', 'mark')
+
+        return [
+            ('department toppers', toppers, lambda: list(toppers.all())),
+            ('department normalized marks', department_marks,
+             lambda: department_marks.aggregate(Avg('normalized_marks'), Max('normalized_marks'))),
+            ('slot marks', slot_marks,
+             lambda: slot_marks.aggregate(Count('marks_obtained'), Min('marks_obtained'), Max('marks_obtained'), Avg('marks_obtained'))),
+            ('rank range position', rank_ahead.values_list('normalized_marks'), lambda: rank_ahead.count()),
+            ('answer key', answer_key, lambda: list(answer_key.all())),
+        ]
+
+    def best_of(self, run, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,66 @@
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from rankpredictor.sheet_parser import parse_candidate_response
+from rankpredictor.utils import parse_candidate_response_soup
+
+
+class Command(BaseCommand):
+    help = "Benchmark the streaming response sheet parser against the BeautifulSoup parser on saved sheets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="Saved response sheet .html files or directories containing them")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per file and parser (best run is kept)")
+
+    def handle(self, *args, **options):
+        files = []
+        for path in map(Path, options['paths']):
+            if path.is_dir():
+                files.extend(sorted(p for p in path.rglob('*') if p.suffix.lower() in ('.html', '.htm')))
+            elif path.is_file():
+                files.append(path)
+            else:
+                raise CommandError(f"{path} does not exist")
+
+        if not files:
+            raise CommandError("No response sheets found")
+
+        repeat = max(1, options['repeat'])
+        total_soup = total_stream = 0
+        mismatches = []
+
+        for path in files:
+            html = path.read_text(encoding='utf-8', errors='replace')
+
+            soup_time, soup_records = self.best_of(parse_candidate_response_soup, html, repeat)
+            stream_time, stream_records = self.best_of(parse_candidate_response, html, repeat)
+            total_soup += soup_time
+            total_stream += stream_time
+
+            same = soup_records == stream_records
+            if not same:
+                mismatches.append(str(path))
+
+            self.stdout.write(
+                f"{path.name}: {len(html) / 1024:.0f} KiB, {len(stream_records)} answered, "
+                f"soup {soup_time * 1000:.2f} ms, stream {stream_time * 1000:.2f} ms, "
+                f"x{soup_time / stream_time:.1f}{'' if same else ' OUTPUT DIFFERS'}"
+            )
+
+        self.stdout.write(
+            f"\n{len(files)} sheets: soup {total_soup * 1000:.1f} ms, stream {total_stream * 1000:.1f} ms, "
+            f"speedup x{total_soup / total_stream:.1f}"
+        )
+
+        if mismatches:
+            raise CommandError(f"Parsers disagree on {len(mismatches)} sheet(s): {', '.join(mismatches)}")
+
+    def best_of(self, parse, html, repeat):
+        best = None
+        records = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            records = parse(html)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, records
@@ -0,0 +1,31 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rankpredictor.jobs import pending_job_ids, run_job
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs. Use with JOB_QUEUE_BACKEND = 'db'."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'JOB_WORKERS', 4), help="Jobs run in parallel")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        processed = 0
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rankpredictor-job') as executor:
+            while True:
+                job_ids = pending_job_ids(workers * 2)
+                if job_ids:
+                    list(executor.map(run_job, job_ids))
+                    processed += len(job_ids)
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+
+        self.stdout.write(f"Processed {processed} job(s)")
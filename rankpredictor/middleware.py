@@ -0,0 +1,50 @@
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from .instrumentation import COUNT_BOUNDS, observe, start_request_timings, end_request_timings
+
+
+class PerformanceMiddleware:
+    """
+    Record the wall time, database queries and pipeline stages (see
+    instrumentation.span) of every request.
+
+    Timings are added to the in-process histograms, keyed by method and URL
+    route. With SERVER_TIMING_HEADER on they are also sent back to staff
+    users in a Server-Timing header; they reveal database timings, so
+    nobody else gets them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings, token = start_request_timings()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            end_request_timings(token)
+        total = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        name = f'request.{request.method} /{match.route}' if match is not None else 'request.unmatched'
+        observe(name, total)
+        observe(f'{name}.db', timings.query_time)
+        observe(f'{name}.queries', timings.queries, COUNT_BOUNDS)
+
+        # request.user is the DRF authenticated user once the view has run
+        user = getattr(request, 'user', None)
+        if getattr(settings, 'SERVER_TIMING_HEADER', False) and getattr(user, 'is_staff', False):
+            metrics = [f'total;dur={total:.1f}', f'db;dur={timings.query_time:.1f};desc="{timings.queries} queries"']
+            # Spans repeated per sheet (fetch, parse) are summed across the worker threads
+            metrics += [
+                f'{span_name};dur={elapsed:.1f}' + (f';desc="{count} calls"' if count > 1 else '')
+                for span_name, elapsed, count in timings.span_totals()
+            ]
+            response['Server-Timing'] = ', '.join(metrics)
+        return response
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:37
+
+from django.db import migrations, models
+
+
+def backfill_score_statistics(apps, schema_editor):
+    CandidateScore = apps.get_model('rankpredictor', 'CandidateScore')
+    ScoreStatistics = apps.get_model('rankpredictor', 'ScoreStatistics')
+
+    running = {}
+    for slot_id, department, marks in CandidateScore.objects.values_list('slot_id', 'slot__department', 'marks_obtained').iterator():
+        for key in (('SLOT', str(slot_id)), ('DEPARTMENT', department)):
+            count, mean, m2 = running.get(key, (0, 0.0, 0.0))
+            count += 1
+            delta = marks - mean
+            mean += delta / count
+            m2 += delta * (marks - mean)
+            running[key] = (count, mean, m2)
+
+    ScoreStatistics.objects.bulk_create([
+        ScoreStatistics(scope=scope, key=key, count=count, mean=mean, m2=m2)
+        for (scope, key), (count, mean, m2) in running.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankpredictor', '0012_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('SLOT', 'SLOT'), ('DEPARTMENT', 'DEPARTMENT')], max_length=20)),
+                ('key', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('m2', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'key'), name='unique_score_statistics')],
+            },
+        ),
+        migrations.RunPython(backfill_score_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:39
+
+import heapq
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_department_toppers(apps, schema_editor):
+    CandidateScore = apps.get_model('rankpredictor', 'CandidateScore')
+    DepartmentToppers = apps.get_model('rankpredictor', 'DepartmentToppers')
+    slack = getattr(settings, 'TOPPER_INDEX_SLACK', 50)
+
+    departments = CandidateScore.objects.values_list('slot__department', flat=True).distinct()
+    for department in departments:
+        scores = CandidateScore.objects.filter(slot__department=department)
+        capacity = max(1, scores.count() // 1000) + slack
+        rows = list(
+            scores.filter(normalized_marks__isnull=False)
+            .order_by('-normalized_marks')
+            .values_list('normalized_marks', 'id')[:capacity]
+        )
+        entries = [[marks, candidate_id] for marks, candidate_id in rows]
+        heapq.heapify(entries)
+        DepartmentToppers.objects.create(department=department, entries=entries, complete=len(rows) < capacity)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankpredictor', '0013_scorestatistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentToppers',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('department', models.CharField(choices=[('CE', 'CE'), ('ME', 'ME'), ('CSIT', 'CSIT'), ('ECE', 'ECE'), ('EE', 'EE'), ('CHE', 'CHE'), ('DSAI', 'DSAI')], max_length=100, unique=True)),
+                ('entries', models.JSONField(blank=True, default=list)),
+                ('complete', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_department_toppers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankpredictor', '0014_departmenttoppers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='progress',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('PREDICT', 'PREDICT'), ('RESCORE', 'RESCORE')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='CandidateResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answers', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('candidate', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='response', to='rankpredictor.candidatescore')),
+                ('slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rankpredictor.slots')),
+            ],
+        ),
+    ]
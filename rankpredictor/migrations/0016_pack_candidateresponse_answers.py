@@ -0,0 +1,89 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:05
+
+import json
+import zlib
+
+from django.db import migrations, models
+
+
+def pack_answers(records):
+    # Same layout as rankpredictor.response_store.pack_answers at the time of this migration (format 1)
+    columns = {
+        "n": [record["question_no"] for record in records],
+        "q": [record["question_Id"] for record in records],
+        "t": [record["q_type"] for record in records],
+        "a": [record["candidate_answer"] for record in records],
+    }
+    payload = json.dumps(columns, separators=(',', ':')).encode('utf-8')
+    return bytes([1]) + zlib.compress(payload, 9)
+
+
+def unpack_answers(blob):
+    # Same as rankpredictor.response_store.unpack_answers at the time of this migration (format 1)
+    if not blob:
+        return []
+    blob = bytes(blob)
+    if blob[0] != 1:
+        raise ValueError(f"Unknown packed answers format {blob[0]}")
+
+    columns = json.loads(zlib.decompress(blob[1:]))
+    return [
+        {
+            "question_no": question_no,
+            "q_type": q_type,
+            "question_Id": question_Id,
+            "candidate_answer": candidate_answer,
+        }
+        for question_no, question_Id, q_type, candidate_answer in zip(columns["n"], columns["q"], columns["t"], columns["a"])
+    ]
+
+
+def pack_stored_answers(apps, schema_editor):
+    CandidateResponse = apps.get_model('rankpredictor', 'CandidateResponse')
+
+    batch = []
+    for response in CandidateResponse.objects.only('id', 'answers').iterator():
+        response.packed_answers = pack_answers(response.answers or [])
+        batch.append(response)
+        if len(batch) >= 1000:
+            CandidateResponse.objects.bulk_update(batch, ['packed_answers'])
+            batch = []
+    CandidateResponse.objects.bulk_update(batch, ['packed_answers'])
+
+
+def unpack_stored_answers(apps, schema_editor):
+    CandidateResponse = apps.get_model('rankpredictor', 'CandidateResponse')
+
+    batch = []
+    for response in CandidateResponse.objects.only('id', 'packed_answers').iterator():
+        response.answers = unpack_answers(response.packed_answers)
+        batch.append(response)
+        if len(batch) >= 1000:
+            CandidateResponse.objects.bulk_update(batch, ['answers'])
+            batch = []
+    CandidateResponse.objects.bulk_update(batch, ['answers'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankpredictor', '0015_candidateresponse_backgroundjob_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidateresponse',
+            name='packed_answers',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.RunPython(pack_stored_answers, unpack_stored_answers),
+        migrations.RemoveField(
+            model_name='candidateresponse',
+            name='answers',
+        ),
+        migrations.RenameField(
+            model_name='candidateresponse',
+            old_name='packed_answers',
+            new_name='answers',
+        ),
+    ]
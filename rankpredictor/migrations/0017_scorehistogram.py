@@ -0,0 +1,53 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+def backfill_score_histograms(apps, schema_editor):
+    CandidateScore = apps.get_model('rankpredictor', 'CandidateScore')
+    ScoreHistogram = apps.get_model('rankpredictor', 'ScoreHistogram')
+    low, bin_width, bins = -50.0, 0.5, 400
+
+    histograms = {}
+    for slot_id, department, marks, normalized in CandidateScore.objects.values_list(
+        'slot_id', 'slot__department', 'marks_obtained', 'normalized_marks'
+    ).iterator():
+        for key in (('SLOT', str(slot_id)), ('DEPARTMENT', department)):
+            for field, value in (('MARKS', marks), ('NORMALIZED', normalized)):
+                if value is None:
+                    continue
+                counts = histograms.setdefault(key + (field,), [0] * bins)
+                counts[min(max(int((value - low) // bin_width), 0), bins - 1)] += 1
+
+    ScoreHistogram.objects.bulk_create([
+        ScoreHistogram(scope=scope, key=key, field=field, low=low, bin_width=bin_width, counts=counts, total=sum(counts))
+        for (scope, key, field), counts in histograms.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankpredictor', '0016_pack_candidateresponse_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('SLOT', 'SLOT'), ('DEPARTMENT', 'DEPARTMENT')], max_length=20)),
+                ('key', models.CharField(max_length=100)),
+                ('field', models.CharField(choices=[('MARKS', 'MARKS'), ('NORMALIZED', 'NORMALIZED')], max_length=20)),
+                ('low', models.FloatField()),
+                ('bin_width', models.FloatField()),
+                ('counts', models.JSONField(blank=True, default=list)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'key', 'field'), name='unique_score_histogram')],
+            },
+        ),
+        migrations.RunPython(backfill_score_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_slot_departments(apps, schema_editor):
+    CandidateScore = apps.get_model('rankpredictor', 'CandidateScore')
+    Slots = apps.get_model('rankpredictor', 'Slots')
+    CandidateScore.objects.update(
+        department=Subquery(Slots.objects.filter(id=OuterRef('slot_id')).values('department')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankpredictor', '0017_scorehistogram'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidatescore',
+            name='department',
+            field=models.CharField(blank=True, choices=[('CE', 'CE'), ('ME', 'ME'), ('CSIT', 'CSIT'), ('ECE', 'ECE'), ('EE', 'EE'), ('CHE', 'CHE'), ('DSAI', 'DSAI')], editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(copy_slot_departments, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='answersheet',
+            index=models.Index(fields=['slot', 'question_no'], name='answersheet_slot_qno_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidatescore',
+            index=models.Index(fields=['department', 'normalized_marks'], name='score_dept_normalized_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidatescore',
+            index=models.Index(fields=['slot', 'marks_obtained'], name='score_slot_marks_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidatescore',
+            index=models.Index(fields=['rank', 'normalized_marks'], name='score_rank_normalized_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+def parse_rank_range(rank):
+    # Same parsing as rankpredictor.rank_table.parse_rank_range at the time of this migration
+    try:
+        bounds = [int(part) for part in rank.replace(' ', '').split('-')]
+    except (AttributeError, ValueError):
+        return None
+    return bounds[0], bounds[-1]
+
+
+def copy_ranks_to_numbers(apps, schema_editor):
+    CandidateScore = apps.get_model('rankpredictor', 'CandidateScore')
+    fields = ['rank_low', 'rank_high', 'normalized_rank_number']
+
+    batch = []
+    for candidate in CandidateScore.objects.only('id', 'rank', 'normalized_rank').iterator(chunk_size=1000):
+        candidate.rank_low, candidate.rank_high = parse_rank_range(candidate.rank) or (None, None)
+        try:
+            candidate.normalized_rank_number = int(candidate.normalized_rank)
+        except (TypeError, ValueError):
+            candidate.normalized_rank_number = None
+        batch.append(candidate)
+        if len(batch) >= 1000:
+            CandidateScore.objects.bulk_update(batch, fields, batch_size=1000)
+            batch = []
+    CandidateScore.objects.bulk_update(batch, fields, batch_size=1000)
+
+
+def copy_numbers_to_ranks(apps, schema_editor):
+    CandidateScore = apps.get_model('rankpredictor', 'CandidateScore')
+
+    batch = []
+    for candidate in CandidateScore.objects.filter(normalized_rank_number__isnull=False).only('id', 'normalized_rank_number').iterator(chunk_size=1000):
+        candidate.normalized_rank = str(candidate.normalized_rank_number)
+        batch.append(candidate)
+        if len(batch) >= 1000:
+            CandidateScore.objects.bulk_update(batch, ['normalized_rank'], batch_size=1000)
+            batch = []
+    CandidateScore.objects.bulk_update(batch, ['normalized_rank'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankpredictor', '0018_candidatescore_department_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidatescore',
+            name='rank_low',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='candidatescore',
+            name='rank_high',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='candidatescore',
+            name='normalized_rank_number',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_ranks_to_numbers, copy_numbers_to_ranks),
+        migrations.RemoveField(
+            model_name='candidatescore',
+            name='normalized_rank',
+        ),
+        migrations.RenameField(
+            model_name='candidatescore',
+            old_name='normalized_rank_number',
+            new_name='normalized_rank',
+        ),
+        migrations.AlterField(
+            model_name='candidatescore',
+            name='normalized_rank',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RemoveIndex(
+            model_name='candidatescore',
+            name='score_rank_normalized_idx',
+        ),
+        migrations.AddIndex(
+            model_name='candidatescore',
+            index=models.Index(fields=['rank_low', 'rank_high', 'normalized_marks'], name='score_rank_range_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankpredictor', '0019_candidatescore_numeric_ranks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('PREDICT', 'PREDICT'), ('RESCORE', 'RESCORE'), ('ANALYTICS', 'ANALYTICS')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='SlotAnalytics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('candidates', models.PositiveIntegerField(default=0)),
+                ('questions', models.JSONField(blank=True, default=list)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('slot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analytics', to='rankpredictor.slots')),
+            ],
+        ),
+    ]
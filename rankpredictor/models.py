@@ -1,6 +1,9 @@
+import uuid
 from django.db import models
-from .choices import DEPARTMENT_CHOICE,SHIFT_CHOICE
+from .choices import DEPARTMENT_CHOICE,SHIFT_CHOICE,JOB_KIND_CHOICE,JOB_STATUS_CHOICE,STATISTICS_SCOPE_CHOICE,HISTOGRAM_FIELD_CHOICE
 from django.contrib.auth.models import User
+from .response_store import unpack_answers
+from .rank_table import parse_rank_range
 
 # Create your models here.
 class Slots(models.Model):
@@ -25,21 +28,179 @@ class AnswerSheet(models.Model):
     mark=models.FloatField()
     slot=models.ForeignKey(Slots,on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['slot', 'question_no'], name='answersheet_slot_qno_idx'),
+        ]
+
     def __str__(self):
         return f'{self.question_no}-{self.question_Id}-{self.slot}'
     
 
+def rank_bounds(rank):
+    """
+    (rank_low, rank_high) stored for a rank label, (None, None) for messages.
+    """
+    return parse_rank_range(rank) or (None, None)
+
+
 class CandidateScore(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)  # One user, one score
     slot = models.ForeignKey(Slots, on_delete=models.CASCADE)
+    # Copy of slot.department, so department filters and sorts use this table's indexes without a join
+    department = models.CharField(max_length=100, choices=DEPARTMENT_CHOICE, null=True, blank=True, editable=False)
     marks_obtained = models.FloatField()
     normalized_marks = models.FloatField(null=True, blank=True)
     gate_score = models.FloatField(null=True, blank=True)
     sheet_url = models.CharField(max_length=500, null=True, blank=True)
-    rank=models.CharField(max_length=50, null=True, blank=True)
-    normalized_rank=models.CharField(max_length=20, null=True, blank=True)
+    rank=models.CharField(max_length=50, null=True, blank=True)  # rank table label shown by the API, e.g. "1201 - 1500"
+    # Bounds parsed from rank, None when it is a message like "Can't predict rank with low marks"
+    rank_low = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    rank_high = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # Snapshot written by refresh_normalized_ranks (re-scoring), the API counts the position on read
+    normalized_rank = models.PositiveIntegerField(null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['department', 'normalized_marks'], name='score_dept_normalized_idx'),
+            models.Index(fields=['slot', 'marks_obtained'], name='score_slot_marks_idx'),
+            models.Index(fields=['rank_low', 'rank_high', 'normalized_marks'], name='score_rank_range_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user.username} - {self.marks_obtained}'
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'slot' in update_fields or 'slot_id' in update_fields:
+            self.department = self.slot.department
+            if update_fields is not None:
+                kwargs['update_fields'] = update_fields = {*update_fields, 'department'}
+        if update_fields is None or 'rank' in update_fields:
+            self.rank_low, self.rank_high = rank_bounds(self.rank)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'rank_low', 'rank_high'}
+        super().save(*args, **kwargs)
+
+
+class ScoreStatistics(models.Model):
+    """
+    Running count / mean / M2 (Welford) of marks_obtained for a slot or a
+    department, kept up to date as CandidateScore rows change.
+    """
+    scope = models.CharField(max_length=20, choices=STATISTICS_SCOPE_CHOICE)
+    key = models.CharField(max_length=100)  # slot id or department
+    count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_score_statistics'),
+        ]
+
+    @property
+    def std(self):
+        # Population standard deviation, like the StdDev aggregate
+        if not self.count:
+            return None
+        return (max(self.m2, 0) / self.count) ** 0.5
+
+    def __str__(self):
+        return f'{self.scope}-{self.key}-{self.count}'
+
+
+class ScoreHistogram(models.Model):
+    """
+    Fixed width histogram of marks_obtained or normalized_marks for a slot
+    or a department, kept up to date as CandidateScore rows change. Bin i
+    counts the scores in [low + i * bin_width, low + (i + 1) * bin_width);
+    scores outside the range are counted in the first / last bin.
+    """
+    scope = models.CharField(max_length=20, choices=STATISTICS_SCOPE_CHOICE)
+    key = models.CharField(max_length=100)  # slot id or department
+    field = models.CharField(max_length=20, choices=HISTOGRAM_FIELD_CHOICE)
+    low = models.FloatField()
+    bin_width = models.FloatField()
+    counts = models.JSONField(default=list, blank=True)
+    total = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key', 'field'], name='unique_score_histogram'),
+        ]
+
+    def __str__(self):
+        return f'{self.scope}-{self.key}-{self.field}-{self.total}'
+
+
+class DepartmentToppers(models.Model):
+    """
+    Highest normalized marks of a department, stored as a bounded min-heap
+    of [normalized_marks, candidate_id] pairs for the GATE score topper mean.
+    """
+    department = models.CharField(max_length=100, choices=DEPARTMENT_CHOICE, unique=True)
+    entries = models.JSONField(default=list, blank=True)
+    complete = models.BooleanField(default=True)  # entries hold every scored candidate
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.department}-{len(self.entries)}'
+
+
+class SlotAnalytics(models.Model):
+    """
+    Per question analytics of a slot (see analytics.py), built by a
+    background job so the analytics endpoint only reads this row.
+    """
+    slot = models.OneToOneField(Slots, on_delete=models.CASCADE, related_name='analytics')
+    candidates = models.PositiveIntegerField(default=0)
+    questions = models.JSONField(default=list, blank=True)
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.slot_id}-{self.candidates}'
+
+
+class CandidateResponse(models.Model):
+    """
+    Answers parsed from a candidate's response sheet, kept so the candidate
+    can be scored again and shown results without downloading the sheet.
+    """
+    candidate = models.OneToOneField(CandidateScore, on_delete=models.CASCADE, related_name='response')
+    slot = models.ForeignKey(Slots, on_delete=models.CASCADE)
+    answers = models.BinaryField(default=b'', blank=True)  # pack_answers() blob, see response_store.py
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def records(self):
+        return unpack_answers(self.answers)
+
+    def __str__(self):
+        return f'{self.candidate_id}-{self.slot_id}'
+
+
+class BackgroundJob(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=JOB_KIND_CHOICE)
+    status = models.CharField(max_length=20, choices=JOB_STATUS_CHOICE, default='PENDING')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    progress = models.JSONField(default=dict, blank=True)  # {"stage", "done", "total"} while running
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}-{self.id}-{self.status}'
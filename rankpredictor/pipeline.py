@@ -0,0 +1,146 @@
+import logging
+from rest_framework import status
+from .models import Slots, CandidateScore, CandidateResponse
+from .utils import get_candidate_response, get_candidate_rank, calculate_gate_score, calculate_normalized_marks, calculate_normalized_rank
+from .slot_registry import resolve_slot
+from .rank_model import predict_rank
+from .response_store import pack_answers
+from .db_router import use_primary
+from .instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+
+def is_valid_scraped_data(scraped_data):
+    return isinstance(scraped_data, list) and all(
+        isinstance(item, dict) and "question_no" in item and "q_type" in item and "question_Id" in item and "candidate_answer" in item
+        for item in scraped_data
+    )
+
+
+@use_primary()
+def run_prediction(user, url, department, shift=None):
+    """
+    Full rank prediction for one response sheet: fetch, parse, score, then
+    store and rank the CandidateScore of `user`. Every read goes to the
+    primary database, as the statistics it uses include the score just
+    written.
+
+    Returns (http_status, payload). Used by the predictRank view and by the
+    background job workers.
+    """
+    try:
+        if not department or not url:
+            return status.HTTP_400_BAD_REQUEST, {
+                "status": 400,
+                "message": "No Data Found",
+                "error": "Please fill mandatory fields",
+                "success": False
+            }
+
+        # Get slot object and its compiled answer key (both cached per process)
+        try:
+            slot, answer_key = resolve_slot(department, shift)
+            logger.debug(f"Predicting rank for user {user.pk} in slot {slot.pk}")
+
+        except Slots.DoesNotExist:
+            return status.HTTP_404_NOT_FOUND, {
+                "status": 404,
+                "message": "No Data Found",
+                "error": "No data found for the given slot",
+                "success": False
+            }
+
+        # Scrape data from the URL
+        try:
+            scraped_data = get_candidate_response(url)
+        except Exception as e:
+            return status.HTTP_400_BAD_REQUEST, {
+                "status": 400,
+                "message": "Failed to scrape data",
+                "error": str(e),
+                "success": False
+            }
+
+        # Validate scraped data format
+        if not is_valid_scraped_data(scraped_data):
+            return status.HTTP_400_BAD_REQUEST, {
+                "status": 400,
+                "message": "Invalid scraped data format",
+                "error": "Scraped data must be a list of dictionaries with keys: question_no, q_type, candidate_answer",
+                "success": False,
+                "data":scraped_data
+            }
+
+        if not answer_key:
+            return status.HTTP_404_NOT_FOUND, {
+                "status": 404,
+                "message": "No AnswerSheet Data Found",
+                "error": "No data found for this slot",
+                "success": False
+            }
+
+        # Calculate marks
+        with span('score'):
+            total_marks, detailed_results = answer_key.score(scraped_data)
+
+        # Everything is computed before the one save, so the statistics / topper /
+        # histogram signals run once per prediction
+        candidate = CandidateScore.objects.filter(user=user, slot=slot).first() or CandidateScore(user=user)
+        candidate.slot = slot
+        candidate.marks_obtained = total_marks
+        candidate.sheet_url = url
+
+        with span('normalize'):
+            candidate.normalized_marks = calculate_normalized_marks(candidate)
+
+        with span('gate'):
+            candidate.gate_score = calculate_gate_score(candidate, candidate.normalized_marks)
+
+        with span('rank'):
+            rank = get_candidate_rank(total_marks, department)
+            candidate.rank = rank
+
+        with span('store'):
+            candidate.save()
+
+            # Keep the answers so the candidate can be re-scored when the key changes
+            CandidateResponse.objects.update_or_create(
+                candidate=candidate,
+                defaults={
+                    "slot": slot,
+                    "answers": pack_answers(scraped_data)
+                }
+            )
+
+        try:
+            # Worked out on every read, later submissions in the range move it
+            with span('normalized-rank'):
+                normalized_rank = str(calculate_normalized_rank(candidate))
+        except Exception as e:
+            logger.debug(f"No normalized rank for candidate {candidate.pk}: {e}")
+            normalized_rank="unable to specify"
+
+
+
+        return status.HTTP_200_OK, {
+            "status": 200,
+            "success": True,
+            "message": "Marks calculated successfully",
+            "rank": rank,
+            "predicted_rank": predict_rank(total_marks, department),
+            "marks_obtained": total_marks,
+            "normalized_marks":candidate.normalized_marks,
+            "gate_score":candidate.gate_score,
+            "normalized_rank":normalized_rank,
+            "detailed_results": detailed_results
+        }
+
+    except Exception as e:
+        logger.exception(f"Rank prediction failed for user {user.pk}")
+        return status.HTTP_500_INTERNAL_SERVER_ERROR, {
+            "status": 500,
+            "message": "An error occurred",
+            "error": str(e),
+            "success": False
+        }
@@ -0,0 +1,159 @@
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from .rank_table import RANK_TABLE, parse_rank_range
+from .statistics import get_score_histogram
+
+
+# Marks grid the curves are evaluated on
+GRID_START = 0.0
+GRID_STOP = 100.0
+GRID_STEP = 0.25
+GRID = np.arange(GRID_START, GRID_STOP + GRID_STEP / 2, GRID_STEP)
+
+
+def decreasing_fit(values, weights=None):
+    """
+    Closest non-increasing sequence to `values` in weighted least squares
+    (pool adjacent violators).
+    """
+    if weights is None:
+        weights = np.ones(len(values))
+
+    blocks = []  # [mean, weight, length]
+    for value, weight in zip(values, weights):
+        blocks.append([value, weight, 1])
+        while len(blocks) > 1 and blocks[-2][0] < blocks[-1][0]:
+            mean, total, length = blocks.pop()
+            blocks[-1][0] = (blocks[-1][0] * blocks[-1][1] + mean * total) / (blocks[-1][1] + total)
+            blocks[-1][1] += total
+            blocks[-1][2] += length
+
+    return np.concatenate([np.full(length, mean) for mean, _, length in blocks])
+
+
+def table_prior(branch):
+    """
+    Piecewise linear marks -> rank curve through the MARKS_DATA ranges: the
+    bottom of a marks range maps to the worst rank of its rank range and
+    the top to the best. Returns (knot marks, knot ranks), or None when the
+    branch has no column.
+    """
+    column = RANK_TABLE.columns.get(branch)
+    if column is None:
+        return None
+
+    knots = {}
+    for lower, upper, rank in zip(RANK_TABLE.lower_bounds, RANK_TABLE.upper_bounds, column):
+        ranks = parse_rank_range(rank)
+        if ranks is None:
+            continue
+        upper = min(upper, GRID_STOP)
+        knots.setdefault(lower, []).append(ranks[1])
+        knots.setdefault(upper, []).append(ranks[0])
+
+    if not knots:
+        return None
+
+    marks = np.array(sorted(knots), dtype=float)
+    ranks = np.array([np.mean(knots[mark]) for mark in sorted(knots)], dtype=float)
+    return marks, decreasing_fit(ranks)
+
+
+class RankModel:
+    """
+    Monotone marks -> rank curve of one department sampled on GRID.
+
+    The static table gives the prior. The department's MARKS histogram (see
+    statistics.py) gives an empirical curve: the share of candidates scoring
+    above a mark, with the scores of a bin spread evenly over it, scaled
+    so that it agrees with the table at the lowest mark the table covers.
+    The two are blended with the empirical weight growing with the number of
+    stored scores (RANK_MODEL_PRIOR_STRENGTH is the count at which both
+    weigh the same), then forced back to non-increasing.
+    """
+
+    def __init__(self, branch, prior, histogram):
+        self.branch = branch
+        self.sample_size = histogram.total if histogram is not None else 0
+        self.min_marks = None
+        self.ranks = None
+
+        if prior is None:
+            return
+
+        knot_marks, knot_ranks = prior
+        covered = GRID >= knot_marks[0]
+        self.min_marks = float(GRID[covered][0])
+        prior_ranks = np.interp(GRID[covered], knot_marks, knot_ranks)
+
+        curve = prior_ranks
+        if self.sample_size:
+            counts = np.asarray(histogram.counts, dtype=float)
+            edges = histogram.low + histogram.bin_width * np.arange(counts.size + 1)
+            below = np.interp(GRID[covered], edges, np.concatenate([[0.0], np.cumsum(counts)]))
+            above = (self.sample_size - below) / self.sample_size
+            if above[0] > 0:
+                population = (prior_ranks[0] - 1) / above[0]
+                empirical_ranks = 1 + above * population
+                strength = getattr(settings, 'RANK_MODEL_PRIOR_STRENGTH', 500)
+                weight = self.sample_size / (self.sample_size + strength)
+                curve = weight * empirical_ranks + (1 - weight) * prior_ranks
+
+        ranks = np.full(GRID.size, np.nan)
+        ranks[covered] = np.maximum(decreasing_fit(curve), 1)
+        self.ranks = ranks.tolist()
+
+    def predict(self, marks):
+        """
+        Predicted rank for the marks, or None when the table does not cover them.
+        """
+        if self.ranks is None or marks is None or not marks >= self.min_marks:
+            return None
+
+        position = (min(marks, GRID_STOP) - GRID_START) / GRID_STEP
+        index = min(int(position), len(self.ranks) - 2)
+        fraction = position - index
+        rank = self.ranks[index] + (self.ranks[index + 1] - self.ranks[index]) * fraction
+        return int(round(rank))
+
+
+def build_rank_model(department):
+    # One row read, the histogram is kept up to date as scores are saved
+    return RankModel(department, table_prior(department), get_score_histogram('DEPARTMENT', department, 'MARKS'))
+
+
+# Process level cache: {department: (built_at, RankModel)}
+_rank_model_cache = {}
+_rank_model_lock = threading.Lock()
+
+
+def get_rank_model(department):
+    """
+    Return the rank model of a department, rebuilt every RANK_MODEL_TTL
+    seconds so it follows the stored scores.
+    """
+    ttl = getattr(settings, 'RANK_MODEL_TTL', 15 * 60)
+    now = time.monotonic()
+
+    entry = _rank_model_cache.get(department)
+    if entry is not None and now - entry[0] < ttl:
+        return entry[1]
+
+    model = build_rank_model(department)
+    with _rank_model_lock:
+        _rank_model_cache[department] = (now, model)
+    return model
+
+
+def invalidate_rank_model(department=None):
+    with _rank_model_lock:
+        if department is None:
+            _rank_model_cache.clear()
+        else:
+            _rank_model_cache.pop(department, None)
+
+
+def predict_rank(marks, department):
+    return get_rank_model(department).predict(marks)
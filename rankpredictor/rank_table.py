@@ -0,0 +1,93 @@
+from bisect import bisect_right
+import numpy as np
+from .constants import BRANCH_MAPPING, MARKS_DATA
+
+
+LOW_MARKS_MESSAGE = "Can't predict rank with low marks"
+OUT_OF_RANGE_MESSAGE = "Marks out of range"
+BRANCH_NOT_FOUND_MESSAGE = "Branch not found"
+
+
+def parse_marks_range(mark_range):
+    """
+    "85-90" -> (85, 90), "90+" -> (90, inf)
+    """
+    if "+" in mark_range:
+        return int(mark_range.replace("+", "")), float('inf')
+    lower_bound, upper_bound = map(int, mark_range.replace(' ', '').split("-"))
+    return lower_bound, upper_bound
+
+
+def parse_rank_range(rank):
+    """
+    "250-700" -> (250, 700), "1" -> (1, 1). None for the text rows.
+    """
+    try:
+        bounds = [int(part) for part in rank.replace(' ', '').split('-')]
+    except (AttributeError, ValueError):
+        return None
+    return bounds[0], bounds[-1]
+
+
+class RankTable:
+    """
+    MARKS_DATA compiled into sorted boundary arrays, one rank column per
+    branch.
+
+    The table is read top down and the first range containing the marks
+    wins (bounds are inclusive), so a mark sitting on a boundary like 85
+    belongs to the higher "85-90" row. With the rows sorted by lower bound
+    that is the last row whose lower bound is <= marks, found by bisection.
+    """
+
+    def __init__(self, marks_data, branch_mapping):
+        ranges = [parse_marks_range(mark_range) for mark_range in marks_data["Marks"]]
+
+        # Ascending by lower bound, keeping the table order for equal bounds
+        # so the row nearest the top still wins
+        order = sorted(range(len(ranges)), key=lambda index: (ranges[index][0], -index))
+        self.lower_bounds = [ranges[index][0] for index in order]
+        self.upper_bounds = [ranges[index][1] for index in order]
+        self._lower_array = np.array(self.lower_bounds, dtype=float)
+        self._upper_array = np.array(self.upper_bounds, dtype=float)
+
+        self.columns = {}
+        for branch, column in branch_mapping.items():
+            if column not in marks_data:
+                continue
+            self.columns[branch] = [
+                marks_data[column][index] if marks_data[column][index] is not None else LOW_MARKS_MESSAGE
+                for index in order
+            ]
+
+    def lookup(self, marks, branch):
+        column = self.columns.get(branch)
+        if column is None:
+            return BRANCH_NOT_FOUND_MESSAGE
+
+        index = bisect_right(self.lower_bounds, marks) - 1
+        if index < 0 or not marks <= self.upper_bounds[index]:
+            return OUT_OF_RANGE_MESSAGE
+        return column[index]
+
+    def lookup_many(self, marks, branch):
+        """
+        Ranks for a whole array of marks in one pass.
+        """
+        column = self.columns.get(branch)
+        marks = np.asarray(marks, dtype=float)
+        if column is None:
+            return [BRANCH_NOT_FOUND_MESSAGE] * marks.size
+
+        indexes = np.searchsorted(self._lower_array, marks, side='right') - 1
+        safe_indexes = np.maximum(indexes, 0)
+        # NaN fails both comparisons, same as in lookup()
+        in_range = (indexes >= 0) & (marks <= self._upper_array[safe_indexes])
+
+        return [
+            column[index] if found else OUT_OF_RANGE_MESSAGE
+            for index, found in zip(safe_indexes.tolist(), in_range.tolist())
+        ]
+
+
+RANK_TABLE = RankTable(MARKS_DATA, BRANCH_MAPPING)
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.db import transaction
+from .models import Slots, CandidateScore, CandidateResponse, rank_bounds
+from .answer_key import load_answer_key, invalidate_answer_key
+from .batch_scoring import score_batch
+from .rank_model import invalidate_rank_model
+from .response_store import unpack_answers
+from .db_router import use_primary
+from .statistics import get_score_statistics, rebuild_score_statistics, rebuild_score_histograms, refresh_department_toppers, get_topper_mean
+from .utils import NORMALIZED_DEPARTMENTS, normalize_marks, gate_score_formula, get_candidate_ranks, refresh_normalized_ranks
+
+
+def iter_chunks(queryset, fields, chunk_size):
+    """
+    Walk a CandidateScore queryset in id order, `chunk_size` rows at a time,
+    without keeping a cursor open between chunks.
+    """
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', *fields)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+@use_primary()
+def rescore_slot(slot_id, report=None, chunk_size=None):
+    """
+    Score every stored candidate of a slot again with the slot's current
+    answer key, from the persisted CandidateResponse answers (no sheet is
+    downloaded), then bring everything derived from the marks up to date:
+
+    1. marks_obtained and rank of the slot's candidates
+    2. score statistics, then normalized_marks of the department (every
+       session shifts when the department stats move)
+    3. topper heap, then gate_score of the department
+    4. normalized_rank of the affected rank ranges
+
+    Each chunk of RESCORE_CHUNK_SIZE candidates is written in its own
+    transaction. `report(stage, done, total)` is called after every chunk.
+    """
+    chunk_size = chunk_size or getattr(settings, 'RESCORE_CHUNK_SIZE', 1000)
+    report = report or (lambda stage, done, total: None)
+
+    slot = Slots.objects.get(id=slot_id)
+    department = slot.department
+
+    # Never score with a compiled key cached before the upload
+    invalidate_answer_key(slot.id)
+    answer_key = load_answer_key(slot.id)
+    if not answer_key:
+        raise ValueError(f"Slot with ID {slot.id} has no answer key.")
+
+    slot_candidates = CandidateScore.objects.filter(slot=slot)
+    department_candidates = CandidateScore.objects.filter(department=department)
+    stored = slot_candidates.filter(response__isnull=False)
+    affected_ranks = set()
+
+    # 1. Marks and rank range
+    total = stored.count()
+    done = 0
+    for rows in iter_chunks(stored, ['response__answers', 'rank_low', 'rank_high'], chunk_size):
+        batch = score_batch(answer_key, [unpack_answers(answers) for _, answers, _, _ in rows])
+        ranks = get_candidate_ranks(batch.totals, department)
+        affected_ranks.update((rank_low, rank_high) for _, _, rank_low, rank_high in rows)
+
+        updated = []
+        for (candidate_id, _, _, _), marks, rank in zip(rows, batch.totals, ranks):
+            rank_low, rank_high = rank_bounds(rank)
+            updated.append(CandidateScore(id=candidate_id, marks_obtained=float(marks), rank=rank, rank_low=rank_low, rank_high=rank_high))
+
+        with transaction.atomic():
+            CandidateScore.objects.bulk_update(updated, ['marks_obtained', 'rank', 'rank_low', 'rank_high'])
+
+        done += len(rows)
+        report('marks', done, total)
+
+    # bulk_update skips the signals that keep the statistics current
+    rebuild_score_statistics(slot_ids=[slot.id], departments=[department])
+
+    # 2. Normalized marks
+    if department in NORMALIZED_DEPARTMENTS:
+        department_stats = get_score_statistics('DEPARTMENT', department)
+        session_stats = {}
+        normalized_queryset = department_candidates
+    else:
+        normalized_queryset = slot_candidates
+
+    total = normalized_queryset.count()
+    done = 0
+    for rows in iter_chunks(normalized_queryset, ['slot_id', 'marks_obtained'], chunk_size):
+        updated = []
+        for candidate_id, candidate_slot_id, marks in rows:
+            if department in NORMALIZED_DEPARTMENTS:
+                if candidate_slot_id not in session_stats:
+                    session_stats[candidate_slot_id] = get_score_statistics('SLOT', candidate_slot_id)
+                marks = normalize_marks(marks, session_stats[candidate_slot_id], department_stats)
+            updated.append(CandidateScore(id=candidate_id, normalized_marks=marks))
+
+        with transaction.atomic():
+            CandidateScore.objects.bulk_update(updated, ['normalized_marks'])
+
+        done += len(rows)
+        report('normalized_marks', done, total)
+
+    # 3. GATE score
+    rebuild_score_histograms(slot_ids=[slot.id], departments=[department])
+    refresh_department_toppers(department)
+    topper_marks = get_topper_mean(department) or 0
+    cutoffs = {
+        department_slot_id: passing_marks or 0
+        for department_slot_id, passing_marks in Slots.objects.filter(department=department).values_list('id', 'passing_marks_general')
+    }
+
+    total = department_candidates.count()
+    done = 0
+    for rows in iter_chunks(department_candidates, ['slot_id', 'normalized_marks', 'rank_low', 'rank_high'], chunk_size):
+        affected_ranks.update((rank_low, rank_high) for _, _, _, rank_low, rank_high in rows)
+        updated = [
+            CandidateScore(id=candidate_id, gate_score=gate_score_formula(normalized, cutoffs[candidate_slot_id], topper_marks))
+            for candidate_id, candidate_slot_id, normalized, _, _ in rows
+            if normalized is not None
+        ]
+
+        with transaction.atomic():
+            CandidateScore.objects.bulk_update(updated, ['gate_score'])
+
+        done += len(rows)
+        report('gate_score', done, total)
+
+    # 4. Normalized rank ((None, None) clears the candidates left without a rank range)
+    report('normalized_rank', 0, len(affected_ranks))
+    normalized_ranks_updated = refresh_normalized_ranks(affected_ranks)
+    report('normalized_rank', len(affected_ranks), len(affected_ranks))
+
+    invalidate_rank_model(department)
+
+    return {
+        "slot_id": slot.id,
+        "rescored": stored.count(),
+        "skipped": slot_candidates.filter(response__isnull=True).count(),
+        "department_candidates": total,
+        "normalized_ranks_updated": normalized_ranks_updated,
+    }
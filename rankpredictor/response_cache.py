@@ -0,0 +1,98 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework.renderers import JSONRenderer
+from .db_router import use_primary
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _version_key(name):
+    return f'rankpredictor:response-version:{name}'
+
+
+def get_version_ttl():
+    # 0 keeps versions until the next write, only right with a cache shared by every worker
+    return getattr(settings, 'RESPONSE_VERSION_TTL', 60) or None
+
+
+def get_version(name):
+    """
+    Current version of a cached response. Versions are the time of the last
+    write in nanoseconds, so they also give the Last-Modified date and never
+    repeat after the cache is flushed.
+
+    Versions expire after RESPONSE_VERSION_TTL seconds: a worker whose cache
+    missed a bump (a per process cache) starts a new version, and so a new
+    ETag and entry, within that time.
+    """
+    cache = get_cache()
+    version = cache.get(_version_key(name))
+    if version is None:
+        cache.add(_version_key(name), time.time_ns(), get_version_ttl())
+        version = cache.get(_version_key(name))
+    return version
+
+
+def bump_version(name):
+    """
+    Mark a cached response as stale. Call it after writing what it shows.
+    """
+    get_cache().set(_version_key(name), time.time_ns(), get_version_ttl())
+
+
+def bump_slot_versions(slot_id):
+    bump_version('slots')
+    bump_version(f'answersheet:{slot_id}')
+
+
+def not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def cached_json_response(request, name, build):
+    """
+    Serve the response called `name` from the cache as pre-rendered JSON.
+
+    `build()` returns (status_code, payload), the payload either data for
+    DRF's JSONRenderer or already encoded JSON bytes. It only runs when the
+    current version is not cached yet, reading from the primary database
+    since that is usually right after a write; error responses (5xx) are
+    never stored.
+    ETag and Last-Modified come from the version, so a client holding the
+    current copy gets a 304 without the body being read at all.
+    """
+    version = get_version(name)
+    etag = quote_etag(f'{name}-{version}')
+    last_modified = version // 1_000_000_000
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': 'private, no-cache',
+    }
+
+    if not_modified(request, etag, last_modified):
+        return HttpResponseNotModified(headers=headers)
+
+    cache = get_cache()
+    entry_key = f'rankpredictor:response:{name}:{version}'
+    entry = cache.get(entry_key)
+    if entry is None:
+        with use_primary():
+            status_code, payload = build()
+        body = payload if isinstance(payload, bytes) else JSONRenderer().render(payload)
+        entry = (status_code, body)
+        if status_code < 500:
+            cache.set(entry_key, entry, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60 * 60))
+
+    status_code, body = entry
+    return HttpResponse(body, status=status_code, content_type='application/json', headers=headers)
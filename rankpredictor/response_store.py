@@ -0,0 +1,46 @@
+import json
+import zlib
+
+
+# First byte of every packed blob, bump when the layout changes
+PACKED_FORMAT_VERSION = 1
+
+
+def pack_answers(records):
+    """
+    Pack the answer records of one sheet into a small blob.
+
+    The records are stored by column (question numbers, question ids, types
+    and answers each in one list, aligned by question index) so the keys are
+    not repeated per question, then zlib compressed.
+    """
+    columns = {
+        "n": [record["question_no"] for record in records],
+        "q": [record["question_Id"] for record in records],
+        "t": [record["q_type"] for record in records],
+        "a": [record["candidate_answer"] for record in records],
+    }
+    payload = json.dumps(columns, separators=(',', ':')).encode('utf-8')
+    return bytes([PACKED_FORMAT_VERSION]) + zlib.compress(payload, 9)
+
+
+def unpack_answers(blob):
+    """
+    Answer records back from pack_answers, as get_candidate_response returns them.
+    """
+    if not blob:
+        return []
+    blob = bytes(blob)  # postgres hands BinaryField values over as memoryview
+    if blob[0] != PACKED_FORMAT_VERSION:
+        raise ValueError(f"Unknown packed answers format {blob[0]}")
+
+    columns = json.loads(zlib.decompress(blob[1:]))
+    return [
+        {
+            "question_no": question_no,
+            "q_type": q_type,
+            "question_Id": question_Id,
+            "candidate_answer": candidate_answer,
+        }
+        for question_no, question_Id, q_type, candidate_answer in zip(columns["n"], columns["q"], columns["t"], columns["a"])
+    ]
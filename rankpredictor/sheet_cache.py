@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from .fetcher import fetch_sheet
+
+
+# Bump when the parsed record format changes so old entries are ignored
+PARSED_FORMAT_VERSION = 1
+
+
+class MemorySheetCache:
+    """
+    Size bounded LRU cache held in the worker process.
+    """
+
+    def __init__(self, location=None, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= len(old)
+            self._entries[key] = value
+            self._total += len(value)
+            while self._total > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._total -= len(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= len(old)
+
+
+class DiskSheetCache:
+    """
+    Size bounded LRU cache stored as one file per key under `location`.
+
+    Recency is the file mtime, touched on every hit. Each process keeps an
+    index of the files in LRU order and rescans the directory every
+    `rescan_interval` seconds to account for files written by other workers.
+    """
+
+    def __init__(self, location, max_bytes=512 * 1024 * 1024, rescan_interval=300):
+        self.location = Path(location)
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self._index = None
+        self._total = 0
+        self._scanned_at = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return self.location / digest[:2] / digest
+
+    def _scan(self):
+        files = []
+        if self.location.exists():
+            for path in self.location.glob('*/*'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, str(path), stat.st_size))
+        files.sort()
+        self._index = OrderedDict((path, size) for _, path, size in files)
+        self._total = sum(self._index.values())
+        self._scanned_at = time.monotonic()
+
+    def _ensure_index(self):
+        if self._index is None or time.monotonic() - self._scanned_at > self.rescan_interval:
+            self._scan()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            value = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if self._index is not None and str(path) in self._index:
+                self._index.move_to_end(str(path))
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(value)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._ensure_index()
+            self._total -= self._index.pop(str(path), 0)
+            self._index[str(path)] = len(value)
+            self._total += len(value)
+            self._evict()
+
+    def delete(self, key):
+        path = self._path(key)
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if self._index is not None:
+                self._total -= self._index.pop(str(path), 0)
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._index:
+            path, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+class DjangoSheetCache:
+    """
+    Store entries in one of the Django CACHES aliases (e.g. redis or
+    memcached shared by every worker). Size bounding and eviction are left
+    to the cache server.
+    """
+
+    def __init__(self, location='default', max_bytes=None, timeout=None):
+        self.cache = caches[location or 'default']
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(f'sheet:{key}')
+
+    def set(self, key, value):
+        self.cache.set(f'sheet:{key}', value, self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(f'sheet:{key}')
+
+
+_sheet_cache = None
+_sheet_cache_lock = threading.Lock()
+
+
+def get_sheet_cache():
+    """
+    Return the configured cache backend, or None when SHEET_CACHE is unset.
+    """
+    global _sheet_cache
+    config = getattr(settings, 'SHEET_CACHE', None)
+    if not config:
+        return None
+    if _sheet_cache is None:
+        with _sheet_cache_lock:
+            if _sheet_cache is None:
+                backend = import_string(config['BACKEND'])
+                options = {'location': config.get('LOCATION')}
+                if config.get('MAX_BYTES'):
+                    options['max_bytes'] = config['MAX_BYTES']
+                _sheet_cache = backend(**options)
+    return _sheet_cache
+
+
+def _url_key(url):
+    return f"url:{hashlib.sha256(url.encode('utf-8')).hexdigest()}"
+
+
+def _body_key(content_hash):
+    return f'body:{content_hash}'
+
+
+def _parsed_key(content_hash):
+    return f'parsed:v{PARSED_FORMAT_VERSION}:{content_hash}'
+
+
+def _load_json(value):
+    if value is None:
+        return None
+    return json.loads(value)
+
+
+def _dump_json(value):
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def get_cached_candidate_response(url, parse):
+    """
+    Return the parsed records for a response sheet, going through two cache
+    levels:
+
+    1. url -> {etag, last_modified, fetched_at, hash}. Within
+       SHEET_CACHE_FRESH_SECONDS the sheet is not requested again; after
+       that it is revalidated with If-None-Match / If-Modified-Since.
+    2. content hash -> raw html and parsed records, so identical documents
+       (or a 304) never go through the parser twice.
+    """
+    cache = get_sheet_cache()
+    if cache is None:
+        return parse(fetch_sheet(url).text)
+
+    url_key = _url_key(url)
+    meta = _load_json(cache.get(url_key))
+    now = time.time()
+
+    if meta is not None and now - meta['fetched_at'] < getattr(settings, 'SHEET_CACHE_FRESH_SECONDS', 6 * 3600):
+        records = _load_json(cache.get(_parsed_key(meta['hash'])))
+        if records is not None:
+            return records
+
+    html = None
+    headers = {}
+    if meta is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    response = fetch_sheet(url, headers=headers or None)
+
+    if response.status_code == 304 and meta is not None:
+        content_hash = meta['hash']
+        meta['fetched_at'] = now
+        cache.set(url_key, _dump_json(meta))
+
+        records = _load_json(cache.get(_parsed_key(content_hash)))
+        if records is not None:
+            return records
+
+        body = cache.get(_body_key(content_hash))
+        if body is not None:
+            html = body.decode('utf-8')
+        else:
+            # Nothing usable left for this url, download it again in full
+            response = fetch_sheet(url)
+
+    if html is None:
+        html = response.text
+        content = html.encode('utf-8')
+        content_hash = hashlib.sha256(content).hexdigest()
+
+        cache.set(_body_key(content_hash), content)
+        cache.set(url_key, _dump_json({
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': now,
+            'hash': content_hash,
+        }))
+
+        records = _load_json(cache.get(_parsed_key(content_hash)))
+        if records is not None:
+            return records
+
+    records = parse(html)
+    cache.set(_parsed_key(content_hash), _dump_json(records))
+    return records
@@ -0,0 +1,270 @@
+from html.parser import HTMLParser
+
+
+OPTION_INDEX_MAP = {
+    "A": 1,
+    "B": 2,
+    "C": 3,
+    "D": 4,
+}
+
+# Elements that never hold children (closed as soon as they open)
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
+    'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound',
+    'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+}
+
+# Text inside these elements is not part of a cell's text
+HIDDEN_TEXT_ELEMENTS = {'script', 'style', 'template', 'rt', 'rp'}
+
+# Whitespace inside these elements is kept as is
+PRESERVE_WHITESPACE_ELEMENTS = {'pre', 'textarea'}
+
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+class Cell:
+    __slots__ = ('parts',)
+
+    def __init__(self):
+        self.parts = []
+
+    @property
+    def text(self):
+        return ''.join(self.parts)
+
+
+class Row:
+    __slots__ = ('cells',)
+
+    def __init__(self):
+        self.cells = []
+
+
+class AnswerTable:
+    """
+    A `menu-tbl` table: the status panel for one question.
+    """
+    __slots__ = ('cells',)
+
+    def __init__(self):
+        self.cells = []
+
+
+class QuestionTable:
+    """
+    A `questionRowTbl` table: the question body with option images.
+    """
+    __slots__ = ('images', 'rows')
+
+    def __init__(self):
+        self.images = []
+        self.rows = []
+
+
+class SheetTokenizer(HTMLParser):
+    """
+    Single forward pass over a response sheet that only records what the
+    scorer needs: the cells of every `menu-tbl` table, and the image sources
+    and row cells of every `questionRowTbl` table.
+
+    Tags open and close the same way BeautifulSoup's html.parser tree
+    builder does (an end tag closes everything up to the last open tag of
+    that name, void elements close immediately), and cell text follows the
+    same whitespace rules, so the cell texts come out exactly as
+    `tag.text` would give them.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.answer_tables = []
+        self.question_tables = []
+
+        # Open elements as [name, captures started by this element]
+        self._stack = []
+        self._open_names = {}
+        self._already_closed = []
+        self._data = []
+
+        self._answer_tables = []     # open menu-tbl tables
+        self._question_tables = []   # open questionRowTbl tables
+        self._rows = []              # open rows inside a questionRowTbl
+        self._cells = []             # open cells being captured
+        self._hidden = 0
+        self._preserve = 0
+
+    # Text handling
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def _flush(self):
+        if not self._data:
+            return
+        data = ''.join(self._data)
+        self._data = []
+
+        if not self._cells or self._hidden:
+            return
+        if not self._preserve and not data.strip(ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        for cell in self._cells:
+            cell.parts.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+
+    # Tag handling
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        self._open(tag, attrs)
+        if tag in VOID_ELEMENTS:
+            self._close(tag)
+            # An explicit end tag for it later on is ignored
+            self._already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        self._open(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._already_closed:
+            self._already_closed.remove(tag)
+            return
+        self._flush()
+        self._close(tag)
+
+    def _open(self, tag, attrs):
+        started = []
+
+        if tag == 'table':
+            classes = ''
+            for name, value in attrs:
+                if name == 'class':
+                    classes = value or ''
+            classes = classes.split()
+            if 'menu-tbl' in classes:
+                table = AnswerTable()
+                self.answer_tables.append(table)
+                self._answer_tables.append(table)
+                started.append((self._answer_tables, table))
+            if 'questionRowTbl' in classes:
+                table = QuestionTable()
+                self.question_tables.append(table)
+                self._question_tables.append(table)
+                started.append((self._question_tables, table))
+
+        elif tag == 'img':
+            if self._question_tables:
+                src = None
+                for name, value in attrs:
+                    if name == 'src':
+                        src = '' if value is None else value
+                for table in self._question_tables:
+                    table.images.append(src)
+
+        elif tag == 'tr':
+            if self._question_tables:
+                row = Row()
+                for table in self._question_tables:
+                    table.rows.append(row)
+                self._rows.append(row)
+                started.append((self._rows, row))
+
+        elif tag == 'td':
+            if self._answer_tables or self._rows:
+                cell = Cell()
+                for table in self._answer_tables:
+                    table.cells.append(cell)
+                for row in self._rows:
+                    row.cells.append(cell)
+                self._cells.append(cell)
+                started.append((self._cells, cell))
+
+        if tag in HIDDEN_TEXT_ELEMENTS:
+            self._hidden += 1
+        if tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self._preserve += 1
+
+        self._stack.append((tag, started))
+        self._open_names[tag] = self._open_names.get(tag, 0) + 1
+
+    def _close(self, tag):
+        if not self._open_names.get(tag):
+            return
+        while self._stack:
+            name, started = self._stack.pop()
+            self._open_names[name] -= 1
+            for open_list, item in started:
+                open_list.remove(item)
+            if name in HIDDEN_TEXT_ELEMENTS:
+                self._hidden -= 1
+            if name in PRESERVE_WHITESPACE_ELEMENTS:
+                self._preserve -= 1
+            if name == tag:
+                break
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def build_candidate_records(answer_tables, question_tables):
+    """
+    Turn the tokenized tables into the candidate answer records, one per
+    answered question.
+    """
+    candidate_answer_record = []
+
+    for indx, answertable in enumerate(answer_tables):
+        answer_table_data = answertable.cells
+        question_type = answer_table_data[1].text.strip()
+        question_status = answer_table_data[5].text.strip()
+        question_id = answer_table_data[3].text.strip()
+
+        if question_status != "Answered":
+            continue
+
+        question_object = {
+            "question_no": indx + 1,
+            "q_type": question_type,
+            "question_Id": question_id,
+        }
+
+        if question_type == "MCQ":
+            all_images = question_tables[indx].images
+            question_object["candidate_answer"] = all_images[OPTION_INDEX_MAP[answer_table_data[7].text.strip()]].split('///')[-1]
+        elif question_type == "MSQ":
+            all_images = question_tables[indx].images
+            all_answers = answer_table_data[7].text.strip().replace(' ', '').split(',')
+            question_object["candidate_answer"] = [
+                f"{all_images[OPTION_INDEX_MAP[answer]].split('///')[-1]}" for answer in all_answers
+            ]
+        else:
+            question_object["candidate_answer"] = question_tables[indx].rows[2].cells[-1].text.strip()
+
+        candidate_answer_record.append(question_object)
+
+    return candidate_answer_record
+
+
+def parse_candidate_response(html):
+    """
+    Parse a digialm response sheet into the candidate answer records.
+    """
+    tokenizer = SheetTokenizer()
+    tokenizer.feed(html)
+    tokenizer.close()
+    return build_candidate_records(tokenizer.answer_tables, tokenizer.question_tables)
@@ -0,0 +1,98 @@
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import CandidateScore, Slots
+from .statistics import (
+    apply_score_change, apply_topper_change, apply_histogram_change,
+    rebuild_score_statistics, rebuild_score_histograms, refresh_department_toppers,
+)
+from .rank_model import invalidate_rank_model
+from .response_cache import bump_slot_versions
+from .slot_registry import invalidate_slot_registry
+
+
+def score_state(instance):
+    return (instance.slot_id, instance.marks_obtained, instance.normalized_marks, instance.department)
+
+
+@receiver(post_init, sender=CandidateScore)
+def remember_candidate_score(sender, instance, **kwargs):
+    # State as last stored in the database, used to undo it from the statistics
+    instance._stored_score = score_state(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=CandidateScore)
+def update_statistics_on_save(sender, instance, **kwargs):
+    old = instance._stored_score
+    new = score_state(instance)
+    if old == new:
+        return
+
+    new_department = new[3]
+    old_department = old[3] if old else None
+
+    if old is None or old[:2] != new[:2]:
+        apply_score_change(
+            (old[0], old_department, old[1]) if old else None,
+            (new[0], new_department, new[1]),
+        )
+    if old is None or (old_department, old[2]) != (new_department, new[2]):
+        apply_topper_change(
+            instance.pk,
+            (old_department, old[2]) if old else None,
+            (new_department, new[2]),
+        )
+    apply_histogram_change(
+        (old[0], old_department, old[1], old[2]) if old else None,
+        (new[0], new_department, new[1], new[2]),
+    )
+    instance._stored_score = new
+
+
+@receiver(post_delete, sender=CandidateScore)
+def update_statistics_on_delete(sender, instance, **kwargs):
+    old = instance._stored_score or score_state(instance)
+    department = old[3]
+    apply_score_change((old[0], department, old[1]), None)
+    apply_topper_change(instance.pk, (department, old[2]), None)
+    apply_histogram_change((old[0], department, old[1], old[2]), None)
+    instance._stored_score = None
+
+
+@receiver(pre_save, sender=Slots)
+def remember_slot_department(sender, instance, using, **kwargs):
+    # Department as stored before this save, read from the database being written
+    instance._stored_department = None
+    if not instance._state.adding and instance.pk is not None:
+        instance._stored_department = Slots.objects.using(using).filter(pk=instance.pk).values_list('department', flat=True).first()
+
+
+def refresh_department_aggregates(departments):
+    # Scores moved with queryset.update(), which skips the CandidateScore signals above
+    rebuild_score_statistics(departments=departments)
+    rebuild_score_histograms(departments=departments)
+    for department in departments:
+        refresh_department_toppers(department)
+        invalidate_rank_model(department)
+
+
+@receiver(post_save, sender=Slots)
+def copy_slot_department(sender, instance, created, **kwargs):
+    # CandidateScore.department mirrors the slot's department
+    if created:
+        return
+
+    old_department = getattr(instance, '_stored_department', None)
+    moved = CandidateScore.objects.filter(slot=instance).exclude(department=instance.department).update(department=instance.department)
+    if moved:
+        departments = sorted({old_department, instance.department} - {None})
+        transaction.on_commit(lambda: refresh_department_aggregates(departments))
+
+
+@receiver(post_save, sender=Slots)
+@receiver(post_delete, sender=Slots)
+def bump_slot_responses(sender, instance, **kwargs):
+    # The slot list and the slot's answer sheet (which shows the slot) are cached, see response_cache.py
+    bump_slot_versions(instance.pk)
+    # Reload the (department, shift) lookup once the write is visible to other connections
+    transaction.on_commit(invalidate_slot_registry)
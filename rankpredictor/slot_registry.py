@@ -0,0 +1,89 @@
+import threading
+import time
+from django.conf import settings
+from .models import Slots
+from .answer_key import get_answer_key
+from .db_router import use_primary
+
+
+class SlotRegistry:
+    """
+    Every slot in memory, keyed by (department, shift), loaded with a single
+    query. Lookups behave like the Slots.objects.get(department=..., shift=...)
+    call they replace, including its exceptions.
+    """
+
+    def __init__(self, slots):
+        self.slots = {}
+        self.by_department = {}
+        for slot in slots:
+            self.slots.setdefault((slot.department, slot.shift), []).append(slot)
+            self.by_department.setdefault(slot.department, []).append(slot)
+
+    def __len__(self):
+        return sum(len(slots) for slots in self.slots.values())
+
+    def find(self, department, shift=None):
+        """
+        Return the one slot of a department (and shift, when given).
+        Raises Slots.DoesNotExist or Slots.MultipleObjectsReturned like get().
+        """
+        if shift:
+            slots = self.slots.get((department, shift), [])
+        else:
+            slots = self.by_department.get(department, [])
+
+        if not slots:
+            raise Slots.DoesNotExist("Slots matching query does not exist.")
+        if len(slots) > 1:
+            raise Slots.MultipleObjectsReturned(f"get() returned more than one Slots -- it returned {len(slots)}!")
+        return slots[0]
+
+
+# Process level registry: (loaded_at, SlotRegistry)
+_registry = None
+_registry_lock = threading.Lock()
+
+
+@use_primary()
+def load_slot_registry():
+    return SlotRegistry(Slots.objects.all())
+
+
+def get_slot_registry():
+    """
+    Return the slot registry, loading it on first use.
+
+    It is dropped whenever a slot is saved or deleted in this process (see
+    signals.py); other worker processes pick the change up once the registry
+    is older than SLOT_REGISTRY_TTL seconds.
+    """
+    global _registry
+    ttl = getattr(settings, 'SLOT_REGISTRY_TTL', 60)
+    now = time.monotonic()
+
+    entry = _registry
+    if entry is not None and now - entry[0] < ttl:
+        return entry[1]
+
+    registry = load_slot_registry()
+    with _registry_lock:
+        _registry = (now, registry)
+    return registry
+
+
+def invalidate_slot_registry():
+    global _registry
+    with _registry_lock:
+        _registry = None
+
+
+def resolve_slot(department, shift=None):
+    """
+    The slot for a department / shift together with its compiled answer key,
+    both from process memory once warm. The slot instance is shared between
+    requests and must not be modified.
+    Raises Slots.DoesNotExist or Slots.MultipleObjectsReturned.
+    """
+    slot = get_slot_registry().find(department, shift)
+    return slot, get_answer_key(slot.id)
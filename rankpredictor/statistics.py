@@ -0,0 +1,360 @@
+import heapq
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from .models import CandidateScore, ScoreStatistics, ScoreHistogram, DepartmentToppers
+
+
+def welford_add(count, mean, m2, value):
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return count, mean, m2
+
+
+def welford_remove(count, mean, m2, value):
+    if count <= 1:
+        return 0, 0.0, 0.0
+    count -= 1
+    delta = value - mean
+    mean -= delta / count
+    m2 -= delta * (value - mean)
+    return count, mean, max(m2, 0.0)
+
+
+def statistics_keys(slot_id, department):
+    return [('SLOT', str(slot_id)), ('DEPARTMENT', department)]
+
+
+def apply_score_change(old, new):
+    """
+    Update the running statistics for a CandidateScore change.
+    `old` and `new` are (slot_id, department, marks_obtained) tuples, or None
+    for a created / deleted score.
+    """
+    changes = {}
+    if old is not None:
+        for key in statistics_keys(old[0], old[1]):
+            changes.setdefault(key, []).append(('remove', old[2]))
+    if new is not None:
+        for key in statistics_keys(new[0], new[1]):
+            changes.setdefault(key, []).append(('add', new[2]))
+
+    with transaction.atomic():
+        # Lock rows in a fixed order so concurrent updates cannot deadlock
+        for scope, key in sorted(changes):
+            stats, _ = ScoreStatistics.objects.select_for_update().get_or_create(scope=scope, key=key)
+            count, mean, m2 = stats.count, stats.mean, stats.m2
+            for operation, value in changes[(scope, key)]:
+                if operation == 'remove':
+                    count, mean, m2 = welford_remove(count, mean, m2, value)
+                else:
+                    count, mean, m2 = welford_add(count, mean, m2, value)
+            stats.count, stats.mean, stats.m2 = count, mean, m2
+            stats.save(update_fields=['count', 'mean', 'm2', 'updated_at'])
+
+
+def get_score_statistics(scope, key):
+    return ScoreStatistics.objects.filter(scope=scope, key=str(key)).first()
+
+
+def projected_score_statistics(scope, key, old_marks, new_marks):
+    """
+    ScoreStatistics as they will be once a score in them changes from
+    old_marks to new_marks (None for a score that is not counted yet), the
+    same steps apply_score_change takes. Nothing is written.
+    """
+    stats = get_score_statistics(scope, key)
+    count, mean, m2 = (stats.count, stats.mean, stats.m2) if stats else (0, 0.0, 0.0)
+    if old_marks is not None:
+        count, mean, m2 = welford_remove(count, mean, m2, old_marks)
+    count, mean, m2 = welford_add(count, mean, m2, new_marks)
+    return ScoreStatistics(scope=scope, key=str(key), count=count, mean=mean, m2=m2)
+
+
+@transaction.atomic
+def rebuild_score_statistics(slot_ids=None, departments=None):
+    """
+    Recompute statistics from the CandidateScore table. Needed after bulk
+    writes (bulk_update, queryset.update) which bypass the model signals.
+    Rebuilds everything when no slot or department is given.
+    """
+    queryset = CandidateScore.objects.all()
+    targets = set()
+
+    if slot_ids is not None or departments is not None:
+        slot_ids = [str(slot_id) for slot_id in slot_ids or []]
+        departments = list(departments or [])
+        targets = {('SLOT', slot_id) for slot_id in slot_ids} | {('DEPARTMENT', department) for department in departments}
+        ScoreStatistics.objects.filter(scope='SLOT', key__in=slot_ids).delete()
+        ScoreStatistics.objects.filter(scope='DEPARTMENT', key__in=departments).delete()
+        queryset = queryset.filter(Q(slot_id__in=slot_ids) | Q(department__in=departments))
+    else:
+        ScoreStatistics.objects.all().delete()
+
+    running = {}
+    for slot_id, department, marks in queryset.values_list('slot_id', 'department', 'marks_obtained').iterator():
+        for key in statistics_keys(slot_id, department):
+            if targets and key not in targets:
+                continue
+            running[key] = welford_add(*running.get(key, (0, 0.0, 0.0)), marks)
+
+    ScoreStatistics.objects.bulk_create([
+        ScoreStatistics(scope=scope, key=key, count=count, mean=mean, m2=m2)
+        for (scope, key), (count, mean, m2) in running.items()
+    ])
+
+
+# Bin layout of the histograms: 0.5 marks wide from -50 to 150, which
+# covers negative marking and normalized marks above 100. Stored rows keep
+# the layout they were built with, run rebuild_score_histograms() after
+# changing it
+HISTOGRAM_LOW = -50.0
+HISTOGRAM_BIN_WIDTH = 0.5
+HISTOGRAM_BINS = 400
+
+HISTOGRAM_FIELDS = {'MARKS': 'marks_obtained', 'NORMALIZED': 'normalized_marks'}
+
+
+def histogram_bin(value, low=HISTOGRAM_LOW, bin_width=HISTOGRAM_BIN_WIDTH, bins=HISTOGRAM_BINS):
+    return min(max(int((value - low) // bin_width), 0), bins - 1)
+
+
+def histogram_changes(score, sign, changes):
+    """
+    Add the bin counts of a (slot_id, department, marks_obtained,
+    normalized_marks) score to `changes`, with `sign` +1 or -1.
+    """
+    slot_id, department, marks, normalized = score
+    for key in statistics_keys(slot_id, department):
+        for field, value in (('MARKS', marks), ('NORMALIZED', normalized)):
+            if value is not None:
+                changes.setdefault(key + (field,), Counter())[histogram_bin(value)] += sign
+
+
+def apply_histogram_change(old, new):
+    """
+    Move a CandidateScore between histogram bins. `old` and `new` are
+    (slot_id, department, marks_obtained, normalized_marks) tuples, or None
+    for a created / deleted score.
+    """
+    changes = {}
+    if old is not None:
+        histogram_changes(old, -1, changes)
+    if new is not None:
+        histogram_changes(new, 1, changes)
+
+    with transaction.atomic():
+        # Same fixed lock order as apply_score_change
+        for scope, key, field in sorted(changes):
+            deltas = {index: delta for index, delta in changes[(scope, key, field)].items() if delta}
+            if not deltas:
+                continue
+
+            histogram, _ = ScoreHistogram.objects.select_for_update().get_or_create(
+                scope=scope, key=key, field=field,
+                defaults={'low': HISTOGRAM_LOW, 'bin_width': HISTOGRAM_BIN_WIDTH, 'counts': [0] * HISTOGRAM_BINS},
+            )
+            for index, delta in deltas.items():
+                histogram.counts[index] = max(histogram.counts[index] + delta, 0)
+                histogram.total = max(histogram.total + delta, 0)
+            histogram.save(update_fields=['counts', 'total', 'updated_at'])
+
+
+@transaction.atomic
+def rebuild_score_histograms(slot_ids=None, departments=None):
+    """
+    Recompute histograms from the CandidateScore table, like
+    rebuild_score_statistics does for the running statistics.
+    """
+    queryset = CandidateScore.objects.all()
+    targets = set()
+
+    if slot_ids is not None or departments is not None:
+        slot_ids = [str(slot_id) for slot_id in slot_ids or []]
+        departments = list(departments or [])
+        targets = {('SLOT', slot_id) for slot_id in slot_ids} | {('DEPARTMENT', department) for department in departments}
+        ScoreHistogram.objects.filter(scope='SLOT', key__in=slot_ids).delete()
+        ScoreHistogram.objects.filter(scope='DEPARTMENT', key__in=departments).delete()
+        queryset = queryset.filter(Q(slot_id__in=slot_ids) | Q(department__in=departments))
+    else:
+        ScoreHistogram.objects.all().delete()
+
+    changes = {}
+    for score in queryset.values_list('slot_id', 'department', 'marks_obtained', 'normalized_marks').iterator():
+        histogram_changes(score, 1, changes)
+
+    histograms = []
+    for (scope, key, field), bins in changes.items():
+        if targets and (scope, key) not in targets:
+            continue
+        counts = [0] * HISTOGRAM_BINS
+        for index, count in bins.items():
+            counts[index] = count
+        histograms.append(ScoreHistogram(
+            scope=scope, key=key, field=field, low=HISTOGRAM_LOW, bin_width=HISTOGRAM_BIN_WIDTH,
+            counts=counts, total=sum(counts),
+        ))
+    ScoreHistogram.objects.bulk_create(histograms)
+
+
+def get_score_histogram(scope, key, field):
+    return ScoreHistogram.objects.filter(scope=scope, key=str(key), field=field).first()
+
+
+def histogram_percentile(histogram, value):
+    """
+    Percentage of scores below `value`, assuming the scores of a bin are
+    spread evenly over it.
+    """
+    if histogram is None or not histogram.total:
+        return None
+
+    position = (value - histogram.low) / histogram.bin_width
+    index = int(position // 1)
+    if index < 0:
+        return 0.0
+    if index >= len(histogram.counts):
+        return 100.0
+
+    below = sum(histogram.counts[:index]) + histogram.counts[index] * (position - index)
+    return 100 * below / histogram.total
+
+
+def histogram_cdf(histogram):
+    """
+    [bin start, percentage of scores below the bin end] for every bin from
+    the first to the last non empty one.
+    """
+    if histogram is None or not histogram.total:
+        return []
+
+    filled = [index for index, count in enumerate(histogram.counts) if count]
+    cdf = []
+    running = sum(histogram.counts[:filled[0]])
+    for index in range(filled[0], filled[-1] + 1):
+        running += histogram.counts[index]
+        cdf.append([histogram.low + index * histogram.bin_width, 100 * running / histogram.total])
+    return cdf
+
+
+def topper_count(total_candidates):
+    """
+    Number of candidates averaged for the topper marks: the top 0.1%.
+    """
+    return max(1, total_candidates // 1000)
+
+
+def topper_capacity(department):
+    stats = get_score_statistics('DEPARTMENT', department)
+    return topper_count(stats.count if stats else 0) + getattr(settings, 'TOPPER_INDEX_SLACK', 50)
+
+
+def load_toppers(department, capacity):
+    """
+    Read the top `capacity` normalized marks of a department from CandidateScore.
+    Returns (heap entries, complete).
+    """
+    rows = list(
+        CandidateScore.objects.filter(department=department, normalized_marks__isnull=False)
+        .order_by('-normalized_marks')
+        .values_list('normalized_marks', 'id')[:capacity]
+    )
+    entries = [[marks, candidate_id] for marks, candidate_id in rows]
+    heapq.heapify(entries)
+    return entries, len(rows) < capacity
+
+
+@transaction.atomic
+def refresh_department_toppers(department):
+    """
+    Rebuild the topper heap of a department from the table.
+    """
+    entries, complete = load_toppers(department, topper_capacity(department))
+    toppers, _ = DepartmentToppers.objects.select_for_update().get_or_create(department=department)
+    toppers.entries = entries
+    toppers.complete = complete
+    toppers.save(update_fields=['entries', 'complete', 'updated_at'])
+    return toppers
+
+
+def apply_topper_change(candidate_id, old, new):
+    """
+    Update the topper heaps when a candidate's normalized marks change.
+    `old` and `new` are (department, normalized_marks) tuples, or None.
+
+    The heap keeps the best `capacity` marks of the department. While it is
+    `complete` it holds every scored candidate; otherwise anything below the
+    heap minimum is unknown, so smaller marks are not added and the heap is
+    reloaded from the table once it drops below the number of toppers needed.
+    """
+    departments = sorted({change[0] for change in (old, new) if change is not None})
+
+    with transaction.atomic():
+        for department in departments:
+            toppers, created = DepartmentToppers.objects.select_for_update().get_or_create(department=department)
+            if created:
+                # First score of a new department index, build it from the table
+                toppers.entries, toppers.complete = load_toppers(department, topper_capacity(department))
+                toppers.save(update_fields=['entries', 'complete', 'updated_at'])
+                continue
+
+            entries = toppers.entries
+            complete = toppers.complete
+            capacity = topper_capacity(department)
+
+            if old is not None and old[0] == department:
+                remaining = [entry for entry in entries if entry[1] != candidate_id]
+                if len(remaining) != len(entries):
+                    entries = remaining
+                    heapq.heapify(entries)
+
+            if new is not None and new[0] == department and new[1] is not None:
+                if complete or (entries and new[1] >= entries[0][0]):
+                    heapq.heappush(entries, [new[1], candidate_id])
+
+            while len(entries) > capacity:
+                heapq.heappop(entries)
+                complete = False
+
+            if not complete and len(entries) < capacity - getattr(settings, 'TOPPER_INDEX_SLACK', 50):
+                entries, complete = load_toppers(department, capacity)
+
+            toppers.entries = entries
+            toppers.complete = complete
+            toppers.save(update_fields=['entries', 'complete', 'updated_at'])
+
+
+def get_topper_mean(department):
+    """
+    Mean normalized marks of the top 0.1% candidates of a department.
+    """
+    toppers = DepartmentToppers.objects.filter(department=department).first()
+    if toppers is None:
+        toppers = refresh_department_toppers(department)
+
+    stats = get_score_statistics('DEPARTMENT', department)
+    best = heapq.nlargest(topper_count(stats.count if stats else 0), toppers.entries)
+    if not best:
+        return None
+    return sum(marks for marks, _ in best) / len(best)
+
+
+def projected_topper_mean(department, candidate_id, normalized_marks, total_candidates):
+    """
+    get_topper_mean as it will be once the candidate's normalized marks are
+    saved, out of total_candidates in the department. Nothing is written.
+    """
+    toppers = DepartmentToppers.objects.filter(department=department).first()
+    if toppers is None:
+        toppers = refresh_department_toppers(department)
+
+    entries = [entry for entry in toppers.entries if candidate_id is None or entry[1] != candidate_id]
+    if normalized_marks is not None:
+        entries.append([normalized_marks, candidate_id or 0])
+    best = heapq.nlargest(topper_count(total_candidates), entries)
+    if not best:
+        return None
+    return sum(marks for marks, _ in best) / len(best)
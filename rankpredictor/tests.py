@@ -1,3 +1,584 @@
-from django.test import TestCase
+import ast
+import io
+import random
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db.models import Avg, Count, StdDev
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from .analytics import build_slot_analytics
+from .answer_key import CompiledAnswerKey, get_answer_key, invalidate_answer_key
+from .batch_scoring import score_batch
+from .fetcher import is_sheet_url, map_concurrently
+from .instrumentation import span, start_request_timings, end_request_timings
+from .jobs import run_job
+from .models import Slots, AnswerSheet, BackgroundJob, CandidateScore, CandidateResponse, SlotAnalytics
+from .response_store import pack_answers
+from .slot_registry import invalidate_slot_registry
+from .response_cache import get_version
+from .statistics import get_score_statistics, get_topper_mean, rebuild_score_statistics, topper_count
+from .sheet_parser import parse_candidate_response
+from .utils import parse_candidate_response_soup, projected_statistics, handle_csv_upload
 
-# Create your tests here.
+
+def reference_score(answer_rows, scraped_data):
+    """
+    The per-question loop predictRank used before answer keys were compiled,
+    kept as the reference both scorers must agree with.
+    `answer_rows` are (question_Id, question_no, answer, q_type, mark).
+    """
+    answer_key = {qid: (answer.strip(), mark, q_type, qno) for qid, qno, answer, q_type, mark in answer_rows}
+    total_marks = 0
+    for user_response in scraped_data:
+        question_Id = int(user_response['question_Id'])
+        candidate_answer = user_response['candidate_answer']
+        if question_Id not in answer_key:
+            continue
+        correct_answer, mark, q_type, _ = answer_key[question_Id]
+        is_correct = False
+        marks_awarded = 0
+        if correct_answer == 'MTA':
+            marks_awarded = mark
+        elif q_type == 'MCQ':
+            is_correct = candidate_answer.lower() == correct_answer.lower()
+            marks_awarded = mark if is_correct else - (mark / 3)
+        elif q_type == 'MSQ':
+            try:
+                correct_options = set(ast.literal_eval(correct_answer))
+            except (SyntaxError, ValueError):
+                correct_options = set(correct_answer.strip("[]").split(","))
+            marks_awarded = mark if correct_options == set(candidate_answer) else 0
+        elif q_type == 'NAT':
+            try:
+                value = float(candidate_answer)
+                for range_str in correct_answer.replace(" ", "").split('OR'):
+                    if 'to' in range_str:
+                        lower_bound, upper_bound = map(float, range_str.split('to'))
+                        if lower_bound <= value <= upper_bound:
+                            is_correct = True
+                            break
+                    elif float(range_str) == value:
+                        is_correct = True
+                        break
+            except ValueError:
+                is_correct = False
+            marks_awarded = mark if is_correct else 0
+        total_marks += marks_awarded
+    return total_marks
+
+
+def response(question_Id, candidate_answer, q_type='MCQ'):
+    return {"question_no": 0, "q_type": q_type, "question_Id": str(question_Id), "candidate_answer": candidate_answer}
+
+
+class ScoringTests(SimpleTestCase):
+    # (question_Id, question_no, answer, q_type, mark) as stored in AnswerSheet
+    ROWS = [
+        (101, 1, 'a.png', 'MCQ', 1.0),
+        (102, 2, 'b.png', 'MCQ', 2.0),
+        (103, 3, "['a.png', 'c.png']", 'MSQ', 2.0),
+        (104, 4, 'a.png,b.png', 'MSQ', 1.0),  # entered by hand, not a list repr
+        (105, 5, '3.99', 'NAT', 1.0),
+        (106, 6, '2 to 4 OR 5 to 6', 'NAT', 2.0),
+        (107, 7, 'abc OR 3', 'NAT', 1.0),  # parsing stops at the bad part
+        (108, 8, 'MTA', 'MCQ', 1.0),
+    ]
+
+    def setUp(self):
+        self.answer_key = CompiledAnswerKey(1, self.ROWS)
+
+    def assertScoresAgree(self, sheets):
+        batch = score_batch(self.answer_key, sheets)
+        for row, sheet in enumerate(sheets):
+            total, detailed_results = self.answer_key.score(sheet)
+            self.assertAlmostEqual(total, reference_score(self.ROWS, sheet), places=9)
+            self.assertAlmostEqual(batch.totals[row], total, places=9)
+
+            # The batch reports the first answer to a question, a repeat only adds to the total
+            per_question = {}
+            for result in detailed_results:
+                per_question.setdefault(result["question_Id"], result)
+            for result in batch.question_results(row):
+                expected = per_question[result["question_Id"]]
+                self.assertEqual(result["is_correct"], expected["is_correct"])
+                self.assertAlmostEqual(result["marks_awarded"], expected["marks_awarded"], places=9)
+
+    def test_mcq(self):
+        self.assertScoresAgree([
+            [response(101, 'a.png'), response(102, 'B.PNG')],  # case insensitive
+            [response(101, 'b.png'), response(102, 'x.png')],  # wrong and unknown option lose a third
+        ])
+        total, _ = self.answer_key.score([response(101, 'b.png'), response(102, 'b.png')])
+        self.assertAlmostEqual(total, -1 / 3 + 2)
+
+    def test_msq_partial_and_over_selection(self):
+        sheets = [
+            [response(103, ['a.png', 'c.png'], 'MSQ'), response(104, ['b.png', 'a.png'], 'MSQ')],
+            [response(103, ['a.png'], 'MSQ')],  # partial
+            [response(103, ['a.png', 'c.png', 'd.png'], 'MSQ')],  # over selection
+            [response(104, ['a.png', 'a.png', 'b.png'], 'MSQ')],  # repeated option
+        ]
+        self.assertScoresAgree(sheets)
+        self.assertEqual([self.answer_key.score(sheet)[0] for sheet in sheets], [3.0, 0, 0, 1.0])
+
+    def test_nat_ranges(self):
+        sheets = [[response(105, value, 'NAT'), response(106, value, 'NAT'), response(107, value, 'NAT')]
+                  for value in ('3.99', '3', '4.0', '5.5', '6.01', '1.9', 'abc', '')]
+        self.assertScoresAgree(sheets)
+        self.assertEqual(self.answer_key.score([response(106, '5.5', 'NAT')])[0], 2.0)
+        self.assertEqual(self.answer_key.score([response(107, '3', 'NAT')])[0], 0)
+
+    def test_mta_and_unattempted(self):
+        sheets = [[], [response(108, 'anything')], [response(999, 'a.png'), response(101, 'a.png')]]
+        self.assertScoresAgree(sheets)
+        batch = score_batch(self.answer_key, sheets)
+        self.assertEqual(list(batch.totals), [0, 1.0, 1.0])
+        self.assertEqual(batch.question_results(0), [])
+
+    def test_repeated_question(self):
+        self.assertScoresAgree([[response(101, 'a.png'), response(101, 'b.png'), response(105, '3.99', 'NAT')]])
+
+    def test_malformed_answers_are_wrong(self):
+        sheet = [
+            response(101, None),
+            response(102, 5),
+            response(103, None, 'MSQ'),
+            response(104, [['a.png']], 'MSQ'),
+            response(105, None, 'NAT'),
+            response(106, ['3'], 'NAT'),
+        ]
+        total, detailed_results = self.answer_key.score(sheet)
+        self.assertFalse(any(result["is_correct"] for result in detailed_results))
+        self.assertAlmostEqual(total, -1 / 3 - 2 / 3)
+
+        batch = score_batch(self.answer_key, [sheet])
+        self.assertAlmostEqual(batch.totals[0], total, places=9)
+        self.assertFalse(batch.correct.any())
+
+    def test_random_sheets(self):
+        rng = random.Random(7)
+        options = ['a.png', 'b.png', 'c.png', 'd.png', 'A.PNG']
+        sheets = []
+        for _ in range(200):
+            sheet = []
+            for question_Id, _, _, q_type, _ in self.ROWS:
+                if rng.random() < 0.2:
+                    continue  # not attempted
+                if q_type == 'MSQ':
+                    sheet.append(response(question_Id, rng.sample(options, rng.randint(1, 3)), q_type))
+                elif q_type == 'NAT':
+                    sheet.append(response(question_Id, rng.choice(['3.99', '3', '5', '6', 'x', '2']), q_type))
+                else:
+                    sheet.append(response(question_Id, rng.choice(options), q_type))
+            rng.shuffle(sheet)
+            sheets.append(sheet)
+        self.assertScoresAgree(sheets)
+
+
+def digialm_question(number, q_type, status, chosen, given=None):
+    """
+    One question panel of a digialm response sheet, in the layout the parsers read.
+    """
+    question_Id = 6409000000 + number
+    rows = ['<table class="questionRowTbl"><tbody>',
+            f'<tr><td class="bold">Q.{number}</td><td class="bold">Question <img src="https://cdn.digialm.com///per/q{number}.png"></td></tr>']
+    if q_type in ('MCQ', 'MSQ'):
+        rows.append('<tr><td></td><td><table>')
+        rows += [f'<tr><td>{letter}.</td><td class="wrngAns"> <img src="https://cdn.digialm.com///per/q{number}o{letter}.png" /> </td></tr>'
+                 for letter in 'ABCD']
+        rows.append('</table></td></tr>')
+    else:
+        rows.append('<tr><td></td><td>Q text</td></tr>')
+        rows.append(f'<tr><td>Given Answer :</td><td class="bold">\n  {given}  </td></tr>')
+    rows.append('</tbody></table>')
+
+    menu = [('Question Type :', q_type), ('Question ID :', question_Id), ('Status :', status),
+            ('Chosen Option :' if q_type != 'NAT' else 'Given :', chosen)]
+    menu_rows = ''.join(f'<tr><td align="right">{label}</td><td class="bold"> {value} </td></tr>' for label, value in menu)
+    return (f'<div class="question-pnl"><table class="questionPnlTbl"><tbody><tr><td>{"".join(rows)}</td>'
+            f'<td valign="top"><table class="menu-tbl"><tbody>{menu_rows}</tbody></table></td></tr></tbody></table></div>')
+
+
+class SheetParserTests(SimpleTestCase):
+    def sheet(self):
+        questions = [
+            digialm_question(1, 'MCQ', 'Answered', 'C'),
+            digialm_question(2, 'MCQ', 'Not Answered', '--'),
+            digialm_question(3, 'MSQ', 'Answered', 'A, D'),
+            digialm_question(4, 'MSQ', 'Marked For Review', 'B'),
+            digialm_question(5, 'NAT', 'Answered', '--', given='3.75'),
+            digialm_question(6, 'NAT', 'Not Answered', '--', given='--'),
+            digialm_question(7, 'MCQ', 'Answered', 'A'),
+        ]
+        return ('<!DOCTYPE html><html><head><script>var cell = "<td>";</script><style>td {}</style></head>'
+                f'<body>{"".join(questions)}</body></html>')
+
+    def test_matches_beautifulsoup_parser(self):
+        html = self.sheet()
+        records = parse_candidate_response(html)
+        self.assertEqual(records, parse_candidate_response_soup(html))
+        self.assertEqual(records, [
+            {"question_no": 1, "q_type": "MCQ", "question_Id": "6409000001", "candidate_answer": "per/q1oC.png"},
+            {"question_no": 3, "q_type": "MSQ", "question_Id": "6409000003", "candidate_answer": ["per/q3oA.png", "per/q3oD.png"]},
+            {"question_no": 5, "q_type": "NAT", "question_Id": "6409000005", "candidate_answer": "3.75"},
+            {"question_no": 7, "q_type": "MCQ", "question_Id": "6409000007", "candidate_answer": "per/q7oA.png"},
+        ])
+
+
+class ScoreStatisticsTests(TestCase):
+    def setUp(self):
+        self.rng = random.Random(11)
+        self.forenoon = Slots.objects.create(department='CE', shift='FORENOON')
+        self.afternoon = Slots.objects.create(department='CE', shift='AFTERNOON')
+        self.other = Slots.objects.create(department='ME', shift='FORENOON')
+        self.users = iter(User.objects.create_user(f'stats{index}') for index in range(1000))
+
+    def add_score(self, slot, marks=None):
+        marks = self.rng.uniform(-5, 95) if marks is None else marks
+        return CandidateScore.objects.create(user=next(self.users), slot=slot, marks_obtained=marks)
+
+    def assertStatisticsMatchTable(self):
+        keys = [('SLOT', slot.id, {'slot': slot}) for slot in (self.forenoon, self.afternoon, self.other)]
+        keys += [('DEPARTMENT', department, {'department': department}) for department in ('CE', 'ME')]
+        for scope, key, lookup in keys:
+            expected = CandidateScore.objects.filter(**lookup).aggregate(
+                count=Count('id'), mean=Avg('marks_obtained'), std=StdDev('marks_obtained'),
+            )
+            stats = get_score_statistics(scope, key)
+            if not expected['count']:
+                self.assertTrue(stats is None or stats.count == 0, (scope, key))
+                continue
+            self.assertEqual(stats.count, expected['count'], (scope, key))
+            self.assertAlmostEqual(stats.mean, expected['mean'], places=6, msg=(scope, key))
+            self.assertAlmostEqual(stats.std, expected['std'], places=6, msg=(scope, key))
+
+    def test_insert_update_move_delete(self):
+        scores = [self.add_score((self.forenoon, self.afternoon, self.other)[index % 3]) for index in range(60)]
+        self.assertStatisticsMatchTable()
+
+        for score in scores[:20]:
+            score.marks_obtained = self.rng.uniform(-5, 95)
+            score.save()
+        self.assertStatisticsMatchTable()
+
+        # Another slot of the same department, then a slot of another department
+        for score in scores[20:30]:
+            score.slot = self.afternoon if score.slot_id == self.forenoon.id else self.forenoon
+            score.save()
+        for score in scores[30:40]:
+            score.slot = self.other if score.department == 'CE' else self.forenoon
+            score.marks_obtained += 1
+            score.save()
+        self.assertStatisticsMatchTable()
+
+        for score in scores[40:55]:
+            score.delete()
+        self.assertStatisticsMatchTable()
+
+        # Down to nothing and back
+        for score in CandidateScore.objects.all():
+            score.delete()
+        self.assertStatisticsMatchTable()
+        self.add_score(self.other, 42.0)
+        self.assertStatisticsMatchTable()
+
+    def assertProjectionMatchesSave(self, candidate):
+        slot_stats, department_stats = projected_statistics(candidate)
+        candidate.save()
+        for projected, scope, key in ((slot_stats, 'SLOT', candidate.slot_id), (department_stats, 'DEPARTMENT', candidate.department)):
+            stats = get_score_statistics(scope, key)
+            self.assertEqual(projected.count, stats.count)
+            self.assertAlmostEqual(projected.mean, stats.mean, places=9)
+            self.assertAlmostEqual(projected.std, stats.std, places=9)
+
+    def test_projected_statistics(self):
+        for index in range(30):
+            self.add_score((self.forenoon, self.afternoon)[index % 2])
+
+        # A candidate not saved yet
+        self.assertProjectionMatchesSave(CandidateScore(user=next(self.users), slot=self.forenoon, marks_obtained=71.5))
+
+        # New marks for a stored candidate
+        candidate = CandidateScore.objects.filter(slot=self.afternoon).first()
+        candidate.marks_obtained = 12.25
+        self.assertProjectionMatchesSave(candidate)
+
+        # Moved to another slot of the department, and to another department
+        candidate = CandidateScore.objects.get(pk=candidate.pk)
+        candidate.slot = self.forenoon
+        candidate.marks_obtained = 80.0
+        self.assertProjectionMatchesSave(candidate)
+        candidate = CandidateScore.objects.get(pk=candidate.pk)
+        candidate.slot = self.other
+        self.assertProjectionMatchesSave(candidate)
+        self.assertStatisticsMatchTable()
+
+
+@override_settings(TOPPER_INDEX_SLACK=3)  # a small heap, so removals also go through the reloads
+class TopperIndexTests(TestCase):
+    def setUp(self):
+        rng = random.Random(5)
+        self.ce_forenoon = Slots.objects.create(department='CE', shift='FORENOON')
+        self.ce_afternoon = Slots.objects.create(department='CE', shift='AFTERNOON')
+        self.me = Slots.objects.create(department='ME', shift='FORENOON')
+
+        # Enough candidates for a top 0.1% of more than one, written without signals
+        User.objects.bulk_create([User(username=f'topper{index}') for index in range(2600)])
+        users = list(User.objects.filter(username__startswith='topper').order_by('id'))
+        slots = [self.ce_forenoon] * 1100 + [self.ce_afternoon] * 1100 + [self.me] * 400
+        CandidateScore.objects.bulk_create([
+            CandidateScore(user=user, slot=slot, department=slot.department, marks_obtained=50,
+                           normalized_marks=round(rng.uniform(0, 100), 2))
+            for user, slot in zip(users, slots)
+        ])
+        rebuild_score_statistics()
+        self.spare_users = iter(User.objects.create_user(f'spare{index}') for index in range(10))
+
+    def assertTopperMeanMatchesTable(self):
+        for department in ('CE', 'ME'):
+            scores = CandidateScore.objects.filter(department=department, normalized_marks__isnull=False)
+            best = list(scores.order_by('-normalized_marks').values_list('normalized_marks', flat=True)[:topper_count(scores.count())])
+            self.assertAlmostEqual(get_topper_mean(department), sum(best) / len(best), places=9, msg=department)
+
+    def top(self, department, count):
+        return list(CandidateScore.objects.filter(department=department).order_by('-normalized_marks')[:count])
+
+    def test_topper_mean(self):
+        self.assertTopperMeanMatchesTable()
+        self.assertEqual(topper_count(CandidateScore.objects.filter(department='CE').count()), 2)
+
+        # New toppers, and a topper falling back
+        for marks in (150.0, 99.999):
+            CandidateScore.objects.create(user=next(self.spare_users), slot=self.ce_forenoon, marks_obtained=90, normalized_marks=marks)
+        self.assertTopperMeanMatchesTable()
+        candidate = self.top('CE', 1)[0]
+        candidate.normalized_marks = 1.0
+        candidate.save()
+        self.assertTopperMeanMatchesTable()
+
+    def test_deletions(self):
+        # More deletions than the slack, the heap has to be reloaded from the table
+        for candidate in self.top('CE', 8):
+            candidate.delete()
+            self.assertTopperMeanMatchesTable()
+
+    def test_department_changes(self):
+        # One candidate moved to a slot of another department
+        candidate = self.top('CE', 1)[0]
+        candidate.slot = self.me
+        candidate.save()
+        self.assertTopperMeanMatchesTable()
+
+        # A whole slot changing department moves its scores with queryset.update(),
+        # including the department's toppers
+        for marks, candidate in zip((120.0, 119.0), CandidateScore.objects.filter(slot=self.ce_afternoon)):
+            candidate.normalized_marks = marks
+            candidate.save()
+        self.assertAlmostEqual(get_topper_mean('CE'), 119.5)
+
+        expected = CandidateScore.objects.filter(slot__in=[self.me, self.ce_afternoon]).count()
+        slot = Slots.objects.get(pk=self.ce_afternoon.pk)
+        slot.department = 'ME'
+        with self.captureOnCommitCallbacks(execute=True):
+            slot.save()
+        self.assertEqual(CandidateScore.objects.filter(department='ME').count(), expected)
+        self.assertTopperMeanMatchesTable()
+
+
+@override_settings(ANSWER_SHEET_BATCH_SIZE=2)  # several batches even for a small key
+class AnswerSheetUploadTests(TestCase):
+    HEADER = 'question_no,question_Id,q_type,answer,mark\n'
+    ROWS = {
+        1: '1,501,MCQ,https://cdn.digialm.com///per/a.png,1\n',
+        2: '2,502,MSQ,"https://cdn.digialm.com///per/a.png,https://cdn.digialm.com///per/b.png",2\n',
+        3: '3,503,NAT,(2-4) (5),2\n',
+        4: '4,504,MTA,,1\n',
+        5: '5,505,MCQ,https://cdn.digialm.com///per/c.png,1\n',
+    }
+
+    def setUp(self):
+        self.slot = Slots.objects.create(department='CE', shift='FORENOON')
+
+    def upload(self, *rows):
+        csv_file = io.BytesIO((self.HEADER + ''.join(rows)).encode())
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            changes = handle_csv_upload(csv_file, self.slot.id)
+        return changes, callbacks
+
+    def stored(self):
+        return {
+            question_Id: (question_no, answer, q_type, mark)
+            for question_Id, question_no, answer, q_type, mark in AnswerSheet.objects.filter(slot=self.slot).values_list(
+                'question_Id', 'question_no', 'answer', 'q_type', 'mark'
+            )
+        }
+
+    def test_reupload_writes_the_difference(self):
+        changes, _ = self.upload(*(self.ROWS[number] for number in (1, 2, 3, 4)))
+        self.assertEqual(changes, {"created": 4, "updated": 0, "deleted": 0, "unchanged": 0})
+        self.assertEqual(self.stored(), {
+            501: (1, 'per/a.png', 'MCQ', 1.0),
+            502: (2, "['per/a.png', 'per/b.png']", 'MSQ', 2.0),
+            503: (3, '2 to 4 OR 5', 'NAT', 2.0),
+            504: (4, '', 'MTA', 1.0),
+        })
+        untouched_id = AnswerSheet.objects.get(slot=self.slot, question_Id=502).id
+
+        answer_key = get_answer_key(self.slot.id)
+        version = get_version(f'answersheet:{self.slot.id}')
+        self.assertEqual(answer_key.questions[501].mcq_key, 'per/a.png')
+
+        # Question 1 changes, 3 is dropped, 5 is new
+        changes, callbacks = self.upload(
+            '1,501,MCQ,https://cdn.digialm.com///per/b.png,1\n', self.ROWS[2], self.ROWS[4], self.ROWS[5],
+        )
+        self.assertEqual(changes, {"created": 1, "updated": 1, "deleted": 1, "unchanged": 2})
+        self.assertEqual(self.stored(), {
+            501: (1, 'per/b.png', 'MCQ', 1.0),
+            502: (2, "['per/a.png', 'per/b.png']", 'MSQ', 2.0),
+            504: (4, '', 'MTA', 1.0),
+            505: (5, 'per/c.png', 'MCQ', 1.0),
+        })
+        self.assertEqual(AnswerSheet.objects.get(slot=self.slot, question_Id=502).id, untouched_id)
+
+        # The compiled key and the cached answer sheet response were dropped after the commit
+        self.assertEqual(len(callbacks), 2)
+        reloaded = get_answer_key(self.slot.id)
+        self.assertIsNot(reloaded, answer_key)
+        self.assertEqual(reloaded.questions[501].mcq_key, 'per/b.png')
+        self.assertNotIn(503, reloaded.questions)
+        self.assertNotEqual(get_version(f'answersheet:{self.slot.id}'), version)
+
+        # The same file again writes nothing and keeps the caches
+        version = get_version(f'answersheet:{self.slot.id}')
+        changes, callbacks = self.upload(
+            '1,501,MCQ,https://cdn.digialm.com///per/b.png,1\n', self.ROWS[2], self.ROWS[4], self.ROWS[5],
+        )
+        self.assertEqual(changes, {"created": 0, "updated": 0, "deleted": 0, "unchanged": 4})
+        self.assertEqual(callbacks, [])
+        self.assertIs(get_answer_key(self.slot.id), reloaded)
+        self.assertEqual(get_version(f'answersheet:{self.slot.id}'), version)
+
+    def test_invalid_row_rejects_the_upload(self):
+        self.upload(self.ROWS[1], self.ROWS[2])
+        with self.assertRaises(ValidationError):
+            self.upload(self.ROWS[1], '2,502,XYZ,a,2\n', self.ROWS[5])
+        self.assertEqual(set(self.stored()), {501, 502})
+
+
+@override_settings(JOB_QUEUE_BACKEND='db')
+class SlotAnalyticsTests(TestCase):
+    def setUp(self):
+        self.slot = Slots.objects.create(department='ME', shift='FORENOON')
+        AnswerSheet.objects.bulk_create([
+            AnswerSheet(question_Id=601, question_no=1, answer='per/a.png', q_type='MCQ', mark=1, slot=self.slot),
+            AnswerSheet(question_Id=602, question_no=2, answer="['per/a.png', 'per/b.png']", q_type='MSQ', mark=2, slot=self.slot),
+            AnswerSheet(question_Id=603, question_no=3, answer='2 to 4', q_type='NAT', mark=2, slot=self.slot),
+        ])
+        # bulk_create skips the signals, and slot ids are reused across tests
+        invalidate_answer_key(self.slot.id)
+        sheets = [
+            [response(601, 'per/a.png'), response(602, ['per/a.png', 'per/b.png'], 'MSQ'), response(603, '9', 'NAT')],
+            [response(601, 'per/b.png'), response(602, ['per/a.png'], 'MSQ'), response(603, '--', 'NAT')],
+            [response(601, 'per/a.png'), response(602, '--', 'MSQ'), response(603, '7', 'NAT')],
+        ]
+        for number, sheet in enumerate(sheets):
+            candidate = CandidateScore.objects.create(
+                user=User.objects.create_user(f'analytics{number}'), slot=self.slot, marks_obtained=0,
+            )
+            CandidateResponse.objects.create(candidate=candidate, slot=self.slot, answers=pack_answers(sheet))
+
+        user = User.objects.create_user('reader')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def get(self, **params):
+        return self.client.get('/api/v1/rankpredictor/analytics/', {'slot_id': self.slot.id, **params})
+
+    def test_reads_the_snapshot_built_by_the_job(self):
+        # Nothing is computed in the request, the first reads queue one job
+        first, second = self.get(), self.get()
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.json()["job_id"], first.json()["job_id"])
+        self.assertEqual(BackgroundJob.objects.filter(kind='ANALYTICS').count(), 1)
+        self.assertFalse(SlotAnalytics.objects.exists())
+
+        run_job(first.json()["job_id"])
+        expected = build_slot_analytics(self.slot.id)
+        data = self.get().json()
+        self.assertEqual(data["candidates"], 3)
+        self.assertEqual(data["questions"], expected["questions"])
+        self.assertEqual([question["question_no"] for question in self.get(toughest=1).json()["questions"]], [3])
+
+        # A fresh snapshot queues nothing, an outdated one is still served while it is rebuilt
+        self.assertEqual(BackgroundJob.objects.filter(kind='ANALYTICS', status='PENDING').count(), 0)
+        with override_settings(ANALYTICS_CACHE_TTL=-1):
+            self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(BackgroundJob.objects.filter(kind='ANALYTICS', status='PENDING').count(), 1)
+
+    def test_slot_without_answer_key(self):
+        self.assertEqual(self.client.get('/api/v1/rankpredictor/analytics/', {'slot_id': 999}).status_code, 404)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+
+class BatchScoreUrlTests(TestCase):
+    SHEET_URL = 'https://cdn.digialm.com//per/g01/pub/585/touchstone/sheet.html'
+
+    def test_is_sheet_url(self):
+        self.assertTrue(is_sheet_url(self.SHEET_URL))
+        for url in [
+            'http://cdn.digialm.com/sheet.html',
+            'https://cdn.digialm.com:8443/sheet.html',
+            'https://cdn.digialm.com.example.com/sheet.html',
+            'https://169.254.169.254/latest/meta-data/',
+            'file:///etc/passwd',
+            'https://[::1/',
+            None,
+            5,
+        ]:
+            self.assertFalse(is_sheet_url(url), url)
+
+    def test_other_hosts_are_not_fetched(self):
+        slot = Slots.objects.create(department='CE', shift='FORENOON')
+        AnswerSheet.objects.create(question_Id=701, question_no=1, answer='per/a.png', q_type='MCQ', mark=1, slot=slot)
+        invalidate_slot_registry()
+        invalidate_answer_key(slot.id)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('batch'))
+        sheet = [response(701, 'per/a.png')]
+        with mock.patch('rankpredictor.views.get_candidate_responses', side_effect=lambda urls: [sheet] * len(urls)) as fetch:
+            data = client.post('/api/v1/rankpredictor/batchscore/', {
+                "department": 'CE',
+                "urls": [self.SHEET_URL, 'http://localhost:8000/admin/'],
+            }, format='json').json()
+
+        fetch.assert_called_once_with([self.SHEET_URL])
+        self.assertEqual([result["url"] for result in data["results"]], [self.SHEET_URL])
+        self.assertEqual(data["results"][0]["marks_obtained"], 1.0)
+        self.assertEqual(data["errors"], [{"url": 'http://localhost:8000/admin/', "error": "Not a response sheet url"}])
+
+
+class RequestTimingTests(SimpleTestCase):
+    def test_worker_spans_reach_the_request(self):
+        def fetch(item):
+            with span('fetch'):
+                if item == 3:
+                    raise ValueError(item)
+                return item * 2
+
+        timings, token = start_request_timings()
+        try:
+            with span('score'):
+                results = map_concurrently(fetch, range(4))
+        finally:
+            end_request_timings(token)
+
+        self.assertEqual(results[:3], [0, 2, 4])
+        self.assertIsInstance(results[3], ValueError)
+        self.assertEqual([name for name, _ in timings.spans].count('fetch'), 4)
+        self.assertEqual(
+            [(name, count) for name, _, count in timings.span_totals()],
+            [('fetch', 4), ('score', 1)],
+        )
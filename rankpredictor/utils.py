@@ -1,14 +1,22 @@
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Avg, StdDev
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
 from .models import AnswerSheet, Slots, CandidateScore
 from rest_framework.exceptions import ValidationError
 import csv
+import io
 import re
 import logging
-import requests
 from bs4 import BeautifulSoup
-import pandas as pd
-from .constants import BRANCH_MAPPING, MARKS_DATA
+from .rank_table import RANK_TABLE
+from .answer_key import invalidate_answer_key
+from .response_cache import bump_version
+from .fetcher import map_concurrently
+from .sheet_cache import get_cached_candidate_response
+from .sheet_parser import parse_candidate_response
+from .instrumentation import span
+from .statistics import projected_score_statistics, projected_topper_mean
 
 
 def handle_csv_upload(csv_file, slot_id):
@@ -17,42 +25,52 @@ def handle_csv_upload(csv_file, slot_id):
     Ensure atomicity and validate the file format.
     """
     try:
-        # Parse and validate the CSV file
+        # Rows are parsed lazily, save_answer_sheet_data pulls them one at a time
         parsed_data = parse_csv(csv_file)
 
         # Save the parsed data into the AnswerSheet model
         return save_answer_sheet_data(parsed_data, slot_id)
+    except ValidationError:
+        raise
     except Exception as e:
         raise ValidationError(f"Error uploading CSV file: {str(e)}")
 
 
+REQUIRED_CSV_HEADERS = {'question_no', 'question_Id', 'q_type', 'answer', 'mark'}
+
+
 def parse_csv(csv_file):
     """
     Parse the uploaded CSV file.
     Validates the format and checks required headers.
+
+    Generator: the upload is decoded chunk by chunk and one row dict is
+    yielded at a time, so the whole file is never held in memory.
     """
+    uploaded = getattr(csv_file, 'file', csv_file)
+    uploaded.seek(0)
+    text = io.TextIOWrapper(uploaded, encoding='ISO-8859-1', newline='')
     try:
-        decoded_file = csv_file.read().decode('ISO-8859-1').splitlines()
-        csv_reader = csv.DictReader(decoded_file)
+        csv_reader = csv.DictReader(text)
 
         # Check if required headers are present
-        required_headers = {'question_no', 'question_Id', 'q_type', 'answer', 'mark'}
-        if not required_headers.issubset(csv_reader.fieldnames or []):
-            raise ValueError(f"CSV format is incorrect. Required headers: {', '.join(required_headers)}")
-
-        parsed_data = []
-        for row in csv_reader:
-            parsed_data.append({
-                'question_no': row.get('question_no'),
-                'question_Id': row.get('question_Id'),
-                'q_type': row.get('q_type'),
-                'answer': row.get('answer'),
-                'mark': row.get('mark')
-            })
-
-        return parsed_data
-    except Exception as e:
-        raise ValidationError(f"Error parsing CSV file: {str(e)}")
+        if not REQUIRED_CSV_HEADERS.issubset(csv_reader.fieldnames or []):
+            raise ValidationError(f"Error parsing CSV file: CSV format is incorrect. Required headers: {', '.join(REQUIRED_CSV_HEADERS)}")
+
+        try:
+            for row in csv_reader:
+                yield {
+                    'question_no': row.get('question_no'),
+                    'question_Id': row.get('question_Id'),
+                    'q_type': row.get('q_type'),
+                    'answer': row.get('answer'),
+                    'mark': row.get('mark')
+                }
+        except csv.Error as e:
+            raise ValidationError(f"Error parsing CSV file: line {csv_reader.line_num}: {str(e)}")
+    finally:
+        # Leave the uploaded file open, Django closes it with the request
+        text.detach()
 
 
 def validate_row(row):
@@ -131,37 +149,74 @@ def validate_row(row):
     return True
 
 
+ANSWER_SHEET_DIFF_FIELDS = ['question_no', 'answer', 'q_type', 'mark']
+
+
+def answer_sheet_values(row):
+    """
+    Row values as they are stored on AnswerSheet, for comparing against the
+    existing key.
+    """
+    try:
+        question_Id = int(row['question_Id'])
+        question_no = int(row['question_no'])
+    except (TypeError, ValueError):
+        raise ValueError("question_no and question_Id must be whole numbers.")
+    return question_Id, {
+        'question_no': question_no,
+        'answer': str(row['answer']),
+        'q_type': row['q_type'],
+        'mark': float(row['mark']),
+    }
+
+
 @transaction.atomic
-def save_answer_sheet_data(parsed_data, slot_id):
+def save_answer_sheet_data(parsed_data, slot_id, batch_size=None):
     """
     Save parsed data to the AnswerSheet model in an atomic transaction.
     If any error occurs, the transaction is rolled back.
+
+    The upload replaces the slot's key, but only the difference is written:
+    rows are matched to the stored ones by question_Id, new questions are
+    inserted, changed ones updated and questions missing from the upload
+    deleted, in batches of ANSWER_SHEET_BATCH_SIZE. Once a row fails
+    nothing more is written, but the remaining rows are still validated so
+    every error is reported together.
+
+    Returns the changeset: {"created", "updated", "deleted", "unchanged"}.
     """
+    batch_size = batch_size or getattr(settings, 'ANSWER_SHEET_BATCH_SIZE', 500)
+
     try:
-        # Fetch the slot object based on slot_id
-        slot = Slots.objects.filter(id=slot_id).first()
+        # Fetch the slot object based on slot_id, locked so concurrent uploads for it run one after the other
+        slot = Slots.objects.select_for_update().filter(id=slot_id).first()
         if not slot:
             raise ValueError(f"Slot with ID {slot_id} not found.")
 
-        answer_sheets = []
+        existing = {}
+        duplicate_ids = []
+        for answer_sheet_id, question_Id, *values in AnswerSheet.objects.filter(slot=slot).order_by('id').values_list(
+            'id', 'question_Id', *ANSWER_SHEET_DIFF_FIELDS
+        ):
+            if question_Id in existing:
+                duplicate_ids.append(answer_sheet_id)
+            else:
+                existing[question_Id] = (answer_sheet_id, dict(zip(ANSWER_SHEET_DIFF_FIELDS, values)))
+
+        to_create = []
+        to_update = []
+        seen = set()
         errors = []
+        changes = {"created": 0, "updated": 0, "deleted": 0, "unchanged": 0}
 
         for idx, row in enumerate(parsed_data):
             try:
                 # Validate the row data
                 validate_row(row)
-
-                # Create AnswerSheet object for each row and associate it with the given slot
-                answer_sheet = AnswerSheet(
-                    question_no=row['question_no'],
-                    question_Id=row['question_Id'],
-                    answer=row['answer'],
-                    q_type=row['q_type'],
-                    mark=float(row['mark']),
-                    slot=slot
-                )
-                answer_sheets.append(answer_sheet)
-
+                question_Id, values = answer_sheet_values(row)
+                if question_Id in seen:
+                    raise ValueError(f"Duplicate question_Id {question_Id}.")
+                seen.add(question_Id)
             except ValueError as e:
                 # If an error occurs, capture the question number and the error message
                 errors.append({
@@ -169,30 +224,92 @@ def save_answer_sheet_data(parsed_data, slot_id):
                     'question_no': row.get('question_no', 'Unknown'),
                     'error': str(e)
                 })
+                continue
+
+            if errors:
+                # The upload will be rejected, only keep validating
+                continue
 
-        # If errors exist, raise an exception with the error details
+            if question_Id not in existing:
+                to_create.append(AnswerSheet(question_Id=question_Id, slot=slot, **values))
+            elif existing[question_Id][1] != values:
+                to_update.append(AnswerSheet(id=existing[question_Id][0], **values))
+            else:
+                changes["unchanged"] += 1
+
+            if len(to_create) >= batch_size:
+                AnswerSheet.objects.bulk_create(to_create)
+                changes["created"] += len(to_create)
+                to_create = []
+            if len(to_update) >= batch_size:
+                AnswerSheet.objects.bulk_update(to_update, ANSWER_SHEET_DIFF_FIELDS)
+                changes["updated"] += len(to_update)
+                to_update = []
+
+        # If errors exist, raise an exception with the error details (rolls back what was already written)
         if errors:
             raise ValidationError({"errors": errors})
 
-        # Bulk create AnswerSheet entries in the database
-        AnswerSheet.objects.bulk_create(answer_sheets)
-        return len(answer_sheets)  # Return the number of records created
+        AnswerSheet.objects.bulk_create(to_create)
+        changes["created"] += len(to_create)
+        AnswerSheet.objects.bulk_update(to_update, ANSWER_SHEET_DIFF_FIELDS, batch_size=batch_size)
+        changes["updated"] += len(to_update)
+
+        removed_ids = duplicate_ids + [
+            answer_sheet_id for question_Id, (answer_sheet_id, _) in existing.items() if question_Id not in seen
+        ]
+        for start in range(0, len(removed_ids), batch_size):
+            AnswerSheet.objects.filter(id__in=removed_ids[start:start + batch_size]).delete()
+        changes["deleted"] = len(removed_ids)
+
+        # Workers keep compiled keys and rendered responses, drop them once the new rows are visible
+        if changes["created"] or changes["updated"] or changes["deleted"]:
+            transaction.on_commit(lambda: invalidate_answer_key(slot.id))
+            transaction.on_commit(lambda: bump_version(f'answersheet:{slot.id}'))
 
+        return changes
+
+    except ValidationError:
+        raise
     except Exception as e:
         raise ValueError(f"Unexpected error: {e}")
 
 
 def get_candidate_response(url):
+    """
+    Download a candidate response sheet and parse the answered questions.
+    Both the download and the parse are cached, see sheet_cache.py.
+    """
+    return get_cached_candidate_response(url, parse_sheet)
+
+
+@span('parse')
+def parse_sheet(html):
+    # parse_candidate_response, timed as the 'parse' stage of a request
+    return parse_candidate_response(html)
+
+
+def get_candidate_responses(urls):
+    """
+    Download and parse many response sheets concurrently.
+    Returns one entry per url, either the record list or the exception raised.
+    """
+    return map_concurrently(get_candidate_response, urls)
+
+
+def parse_candidate_response_soup(html):
+    """
+    BeautifulSoup version of sheet_parser.parse_candidate_response.
+    Kept as the reference implementation for the parser benchmark.
+    """
     option_index_map={
         "A":1,
         "B":2,
         "C":3,
         "D":4,
     }
-    
-    website = requests.get(url)
-    
-    soup = BeautifulSoup(website.text, "html.parser")
+
+    soup = BeautifulSoup(html, "html.parser")
 
     # getting all answer table
     all_answer_table = soup.find_all('table',{'class':'menu-tbl'})
@@ -255,62 +372,65 @@ def get_candidate_response(url):
 
 
 def get_candidate_rank(marks, branch):
-    # Map branch to the column name
-    branch_column = BRANCH_MAPPING.get(branch)
-    # print("branch", branch_column)
-    df=pd.DataFrame(MARKS_DATA)
-    if not branch_column:
-        return "Branch not found"
-    
-    # Iterate through the DataFrame to find the corresponding rank range
-    for index, row in df.iterrows():
-        mark_range = row["Marks"]
-        # Split marks range into lower and upper bounds
-        if "+" in mark_range:
-            lower_bound = int(mark_range.replace("+", ""))
-            if marks >= lower_bound:
-                return row[branch_column]
-        else:
-            lower_bound, upper_bound = map(int, mark_range.replace(' ','').split("-"))
-            # print(lower_bound,"=",upper_bound)
-            if lower_bound <= marks <= upper_bound:
-                rank=row[branch_column]
-                if rank is None:
-                    return "Can't predict rank with low marks"
-                return row[branch_column]
-    
-    return "Marks out of range"
+    """
+    Rank range for the marks from the MARKS_DATA table of the branch.
+    """
+    return RANK_TABLE.lookup(marks, branch)
+
+
+def get_candidate_ranks(marks, branch):
+    """
+    Rank ranges for a list / array of marks of one branch.
+    """
+    return RANK_TABLE.lookup_many(marks, branch)
 
 
 logger = logging.getLogger(__name__)
 
-def calculate_normalized_marks(candidate):
-    slot = candidate.slot  
-    if slot.department in ["CE", "CSIT"]:
-        # Get session-level stats
-        session_stats = CandidateScore.objects.filter(slot=slot).aggregate(
-            session_avg=Avg('marks_obtained'),
-            session_std=StdDev('marks_obtained')
-        )
-        session_avg = session_stats['session_avg'] or 0
-        session_std = session_stats['session_std'] or 1  # Avoid division by zero
+# Departments whose marks are normalized across sessions
+NORMALIZED_DEPARTMENTS = ["CE", "CSIT"]
 
-        # Get department-level stats
-        department_stats = CandidateScore.objects.filter(slot__department=slot.department).aggregate(
-            department_avg=Avg('marks_obtained'),
-            department_std=StdDev('marks_obtained')
-        )
-        department_avg = department_stats['department_avg'] or 0
-        department_std = department_stats['department_std'] or 1  # Avoid division by zero
 
-        # Handle edge cases
-        if session_std == 0:
-            session_std = 1
-        if department_std == 0:
-            department_std = 1
+def normalize_marks(marks_obtained, session_stats, department_stats):
+    """
+    Normalization formula, from the ScoreStatistics of the candidate's slot
+    and department.
+    """
+    session_avg = session_stats.mean if session_stats else 0
+    session_std = (session_stats.std if session_stats else None) or 1  # Avoid division by zero
+
+    department_avg = department_stats.mean if department_stats else 0
+    department_std = (department_stats.std if department_stats else None) or 1  # Avoid division by zero
+
+    # Handle edge cases
+    if session_std == 0:
+        session_std = 1
+    if department_std == 0:
+        department_std = 1
+
+    return ((marks_obtained - session_avg) / session_std) * department_std + department_avg
+
+
+def projected_statistics(candidate):
+    """
+    (slot stats, department stats) of a candidate as they will be once its
+    marks_obtained is saved, so everything can be computed before one save.
+    """
+    slot = candidate.slot
+    stored = candidate._stored_score  # (slot_id, marks, normalized, department) as last saved, see signals.py
+    old_slot_marks = stored[1] if stored and stored[0] == slot.id else None
+    old_department_marks = stored[1] if stored and stored[3] == slot.department else None
+    return (
+        projected_score_statistics('SLOT', slot.id, old_slot_marks, candidate.marks_obtained),
+        projected_score_statistics('DEPARTMENT', slot.department, old_department_marks, candidate.marks_obtained),
+    )
+
 
-        # Normalization formula
-        normalized_marks = ((candidate.marks_obtained - session_avg) / session_std) * department_std + department_avg
+def calculate_normalized_marks(candidate):
+    slot = candidate.slot  
+    if slot.department in NORMALIZED_DEPARTMENTS:
+        # Session and department stats are maintained incrementally, see statistics.py
+        normalized_marks = normalize_marks(candidate.marks_obtained, *projected_statistics(candidate))
     else:
         normalized_marks = candidate.marks_obtained
     
@@ -318,52 +438,87 @@ def calculate_normalized_marks(candidate):
     return normalized_marks
 
 
+def gate_score_formula(normalized_mark, cutoff_marks, topper_marks):
+    # Edge cases
+    if topper_marks == 0 or normalized_mark <= cutoff_marks:
+        return 0
+    elif topper_marks == cutoff_marks:
+        return 0
+    return 350 + 650 * (normalized_mark - cutoff_marks) / (topper_marks - cutoff_marks)
+
+
 def calculate_gate_score(candidate,candidate_normalized_mark):
     slot = candidate.slot
 
     # Get cutoff marks (from Slots table)
     cutoff_marks = slot.passing_marks_general or 0
 
-    # Get top 1% candidates in the same department
-    total_candidates = CandidateScore.objects.filter(slot__department=slot.department).count()
-    top_1_percent_candidates = (
-        CandidateScore.objects.filter(slot__department=slot.department)
-        .order_by('-normalized_marks')[:max(1, total_candidates // 1000)]
+    # Mean of the top 0.1% normalized marks in the department (maintained incrementally, see statistics.py),
+    # counting the candidate's own marks before they are saved
+    stored = candidate._stored_score
+    department_stats = projected_score_statistics(
+        'DEPARTMENT', slot.department,
+        stored[1] if stored and stored[3] == slot.department else None,
+        candidate.marks_obtained,
     )
+    topper_marks = projected_topper_mean(slot.department, candidate.pk, candidate_normalized_mark, department_stats.count) or 0
 
-    # Compute the mean of top 1% marks
-    topper_marks = top_1_percent_candidates.aggregate(Avg('normalized_marks'))['normalized_marks__avg'] or 0
-
-    # Edge cases
-    if topper_marks == 0 or candidate_normalized_mark <= cutoff_marks:
-        gate_score = 0
-    elif topper_marks == cutoff_marks:
-        gate_score = 0
-    else:
-        gate_score = 350 + 650 * (candidate_normalized_mark - cutoff_marks) / (topper_marks - cutoff_marks)
+    gate_score = gate_score_formula(candidate_normalized_mark, cutoff_marks, topper_marks)
 
     logger.info(f"GATE score calculated for candidate {candidate.id}: {candidate.gate_score}")
     return gate_score
 
 
-@transaction.atomic
-def calculate_normalized_rank(current_candidate_rank):
-    candidate_in_same_rank_range = list(
-        CandidateScore.objects.filter(rank=current_candidate_rank).order_by("-normalized_marks")
-    )
-    print(candidate_in_same_rank_range)
-    
-    current_rank = int(current_candidate_rank.replace(" ","").split('-')[0])
-    print(current_rank)
-    for candidate in candidate_in_same_rank_range:
-        candidate.normalized_rank = current_rank
-        current_rank += 1
+def calculate_normalized_rank(candidate):
+    """
+    Position of the candidate among everyone in the same rank range, ordered
+    by normalized marks (highest first, ties by id). Computed with one
+    indexed count, nothing else in the range is read or rewritten.
+    """
+    if candidate.rank_low is None:
+        raise ValueError(f"No rank range in {candidate.rank!r}")
+
+    if candidate.normalized_marks is None:
+        ahead = Q(normalized_marks__isnull=False) | Q(normalized_marks__isnull=True, id__lt=candidate.id)
+    else:
+        ahead = Q(normalized_marks__gt=candidate.normalized_marks) | Q(normalized_marks=candidate.normalized_marks, id__lt=candidate.id)
 
-    # Bulk update in a single DB call
-    CandidateScore.objects.bulk_update(candidate_in_same_rank_range, ["normalized_rank"])
+    return candidate.rank_low + CandidateScore.objects.filter(
+        ahead, rank_low=candidate.rank_low, rank_high=candidate.rank_high
+    ).count()
 
-    
 
+def refresh_normalized_ranks(ranks=None, batch_size=1000):
+    """
+    Recompute the stored normalized_rank of whole rank ranges (all of them
+    when `ranks` is None, otherwise the (rank_low, rank_high) pairs given)
+    with a single ROW_NUMBER() OVER (PARTITION BY rank_low, rank_high)
+    query. For bulk re-scoring; the API does not read the stored value, it
+    uses calculate_normalized_rank so the position is never stale.
+    """
+    queryset = CandidateScore.objects.filter(rank_low__isnull=False)
+    if ranks is not None:
+        # Whole partitions of every range start, a few extra ranges are harmless
+        queryset = queryset.filter(rank_low__in={rank_low for rank_low, _ in ranks if rank_low is not None})
+
+    positions = queryset.annotate(
+        position=Window(
+            expression=RowNumber(),
+            partition_by=[F('rank_low'), F('rank_high')],
+            order_by=[F('normalized_marks').desc(nulls_last=True), F('id').asc()],
+        )
+    ).values_list('id', 'rank_low', 'position', 'normalized_rank')
 
+    changed = []
+    for candidate_id, rank_low, position, stored in positions.iterator():
+        normalized_rank = rank_low + position - 1
+        if normalized_rank != stored:
+            changed.append(CandidateScore(id=candidate_id, normalized_rank=normalized_rank))
 
+    CandidateScore.objects.bulk_update(changed, ['normalized_rank'], batch_size=batch_size)
 
+    # A rank that is a message ("Can't predict rank with low marks") has no position
+    cleared = 0
+    if ranks is None or any(rank_low is None for rank_low, _ in ranks):
+        cleared = CandidateScore.objects.filter(rank_low__isnull=True, normalized_rank__isnull=False).update(normalized_rank=None)
+    return len(changed) + cleared
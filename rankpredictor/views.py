@@ -2,20 +2,36 @@ from rest_framework.views import APIView
 from rest_framework.decorators import api_view,authentication_classes,permission_classes
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from .serializer import SlotsSerializer,AnswerSheetSerializer
 from rest_framework.exceptions import ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import Slots,AnswerSheet,CandidateScore
-from .utils import handle_csv_upload, get_candidate_response, get_candidate_rank, calculate_gate_score, calculate_normalized_marks, calculate_normalized_rank
+from .utils import handle_csv_upload, get_candidate_responses, get_candidate_ranks, calculate_normalized_rank
+from .answer_key import get_answer_key
+from .slot_registry import resolve_slot
+from .rank_model import get_rank_model
+from .analytics import get_slot_analytics, analytics_outdated
+from .statistics import get_score_histogram, histogram_percentile, histogram_cdf
+from .response_cache import cached_json_response
+from .fast_reads import render_answer_sheets
+from .batch_scoring import score_batch
+from .fetcher import is_sheet_url
+from .pipeline import run_prediction, is_valid_scraped_data
+from .jobs import enqueue_job, schedule_slot_analytics
+from .db_router import use_primary
+from .instrumentation import get_metrics, reset_metrics
+from .models import BackgroundJob
+from django.conf import settings
 import requests
 from bs4 import BeautifulSoup
-import ast
 # Create your views here.
 
 
 class SlotsApi(APIView):
     permission_classes=[IsAuthenticated]
 
+    @use_primary()
     def post(self,request):
         data=request.data
         serializer=SlotsSerializer(data=data)
@@ -39,27 +55,32 @@ class SlotsApi(APIView):
     
 
     def get(self, request):
+        # Served pre-rendered until a slot is written, see response_cache.py
+        return cached_json_response(request, 'slots', self.build_slots)
+
+    def build_slots(self):
         querySet = Slots.objects.all()
         
         # If no records are found, return a 404 response
         if not querySet.exists():
-            return Response({
+            return status.HTTP_404_NOT_FOUND, {
                 "status": 404,
                 "message": "No slots available",
                 "success": False
-            }, status=status.HTTP_404_NOT_FOUND)
+            }
 
         # Serialize the data
         serializer = SlotsSerializer(querySet, many=True)
 
-        return Response({
+        return status.HTTP_200_OK, {
             "status": 200,
             "message": "Slots data retrieved successfully",
             "data": serializer.data,
             "success": True
-        }, status=status.HTTP_200_OK)
+        }
 
 
+    @use_primary()
     def put(self, request):
         slot_id = request.data.get('id')
 
@@ -102,6 +123,7 @@ class SlotsApi(APIView):
 class AnswerSheetAPi(APIView):
     permission_classes = [IsAuthenticated]
 
+    @use_primary()
     def post(self, request):
         # Get the uploaded CSV file and slot_id from the request
         csv_file = request.FILES.get('file')  # Get the uploaded file
@@ -123,14 +145,19 @@ class AnswerSheetAPi(APIView):
                     "success": False
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Remove existing entries for the given slot_id
-            AnswerSheet.objects.filter(slot_id=slot_id).delete()
+            # Process the CSV upload with the slot ID, replacing the stored key in one transaction
+            changes = handle_csv_upload(csv_file, slot_id)
+
+            # Stored candidates of the slot were scored with the old key
+            rescore_job = None
+            if changes['created'] or changes['updated'] or changes['deleted']:
+                rescore_job = enqueue_job('RESCORE', {"slot_id": int(slot_id)}, user=request.user)
 
-            # Process the CSV upload with the slot ID
-            records_created = handle_csv_upload(csv_file, slot_id)
             return Response({
                 "status": 201,
-                "message": f"{records_created} answer sheets created successfully.",
+                "message": f"{changes['created']} answer sheets created, {changes['updated']} updated and {changes['deleted']} deleted successfully.",
+                "changes": changes,
+                "rescore_job_id": str(rescore_job.id) if rescore_job else None,
                 "success": True
             }, status=status.HTTP_201_CREATED)
 
@@ -139,7 +166,7 @@ class AnswerSheetAPi(APIView):
             return Response({
                 "status": 400,
                 "message": "Error in processing answer sheets.",
-                "errors": e.detail.get('errors', str(e)),
+                "errors": e.detail.get('errors', e.detail) if isinstance(e.detail, dict) else e.detail,
                 "success": False
             }, status=status.HTTP_400_BAD_REQUEST)
 
@@ -153,44 +180,239 @@ class AnswerSheetAPi(APIView):
 
 
     def get(self,request):
-        try:
-            # Get the 'id' parameter from the request
-            id = request.query_params.get('id')  # Use query_params for GET request params
+        # Get the 'id' parameter from the request
+        id = request.query_params.get('id')  # Use query_params for GET request params
+
+        if id is not None and id.isdigit():
+            # Served pre-rendered until the slot's key is written, see response_cache.py
+            return cached_json_response(request, f'answersheet:{int(id)}', lambda: render_answer_sheets(int(id)))
 
+        status_code, payload = self.build_answer_sheets(id)
+        return Response(payload, status=status_code)
+
+    def build_answer_sheets(self, id):
+        """
+        Serializer based payload. Numeric ids take the faster
+        render_answer_sheets() path, which gives the same JSON.
+        """
+        try:
             # Fetch the answer sheets based on the id
             answer_sheets = AnswerSheet.objects.filter(slot=id).order_by('question_no')
 
             if not answer_sheets.exists():
-                return Response({
+                return status.HTTP_404_NOT_FOUND, {
                     "status": 404,
                     "message": "No Data Found",
                     "error": 'No data found for the given slot',
                     "success": False
-                }, status=status.HTTP_404_NOT_FOUND)
+                }
 
             # Serialize the data
             serializer = AnswerSheetSerializer(instance=answer_sheets, many=True)
             
-            return Response({
+            return status.HTTP_200_OK, {
                 "status": 200,
                 "message": "Data fetched successfully",
                 "data": serializer.data,
                 "success": True
-            }, status=status.HTTP_200_OK)
+            }
 
         except Exception as e:
-            return Response({
+            return status.HTTP_500_INTERNAL_SERVER_ERROR, {
                 "status": 501,
                 "message": "An error occurred",
                 "error": str(e),
                 "success": False
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            }
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def predictRank(request):
+    status_code, payload = run_prediction(
+        request.user,
+        request.data.get("url"),
+        request.data.get("department"),
+        request.data.get("shift"),
+    )
+    return Response(payload, status=status_code)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def candidateResults(request):
+    """
+    Stored result of the user's last prediction, with the per question
+    results worked out from the stored answers (the sheet is not fetched).
+    """
+    candidate = CandidateScore.objects.select_related('response').filter(user=request.user).first()
+    response = getattr(candidate, 'response', None) if candidate else None
+
+    if response is None:
+        return Response({
+            "status": 404,
+            "message": "No Data Found",
+            "error": "No stored response sheet, please submit it again",
+            "success": False
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    answer_key = get_answer_key(candidate.slot_id)
+    _, detailed_results = answer_key.score(response.records)
+
+    return Response({
+        "status": 200,
+        "success": True,
+        "message": "Results retrieved successfully",
+        "rank": candidate.rank,
+        "marks_obtained": candidate.marks_obtained,
+        "normalized_marks": candidate.normalized_marks,
+        "gate_score": candidate.gate_score,
+        # Position in the rank range as of now, not as of the candidate's submission
+        "normalized_rank": "unable to specify" if candidate.rank_low is None else str(calculate_normalized_rank(candidate)),
+        "detailed_results": detailed_results
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def slotAnalytics(request):
+    """
+    Per question attempt rate, accuracy, difficulty and option distribution
+    of a slot. `toughest=N` returns only the N questions fewest candidates
+    got right.
+
+    Served from the slot's stored snapshot, built by a background job: a
+    missing or outdated snapshot queues a rebuild, and the first request
+    for a slot gets a 202 with the job id.
+    """
+    slot_id = request.query_params.get('slot_id')
+    toughest = request.query_params.get('toughest')
+
+    try:
+        slot_id = int(slot_id)
+        toughest = int(toughest) if toughest else None
+    except (TypeError, ValueError):
+        return Response({
+            "status": 400,
+            "message": "No Data Found",
+            "error": "slot_id (and toughest, if given) must be numbers",
+            "success": False
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if not AnswerSheet.objects.filter(slot_id=slot_id).exists():
+        return Response({
+            "status": 404,
+            "message": "No Data Found",
+            "error": "No answer key found for the given slot",
+            "success": False
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    snapshot = get_slot_analytics(slot_id)
+    job = schedule_slot_analytics(slot_id) if analytics_outdated(snapshot) else None
+
+    if snapshot is None:
+        return Response({
+            "status": 202,
+            "message": "Analytics are being computed, try again shortly",
+            "job_id": str(job.id),
+            "success": True
+        }, status=status.HTTP_202_ACCEPTED)
+
+    questions = snapshot.questions
+    if toughest is not None:
+        questions = sorted(
+            (question for question in questions if question["difficulty"] is not None),
+            key=lambda question: question["difficulty"],
+            reverse=True
+        )[:toughest]
+
+    return Response({
+        "status": 200,
+        "success": True,
+        "message": "Analytics retrieved successfully",
+        "slot_id": snapshot.slot_id,
+        "candidates": snapshot.candidates,
+        "built_at": snapshot.built_at,
+        "questions": questions
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def scorePercentile(request):
+    """
+    Percentile of a score within a slot (`slot_id`) or a department
+    (`department`), answered from the stored histogram. `field` is `marks`
+    (default) or `normalized`. Without `value` the user's own stored score
+    is used, and without a slot or department the user's own slot.
+    `cdf=true` adds the cumulative distribution.
+    """
+    params = request.query_params
+    field = 'NORMALIZED' if params.get('field') == 'normalized' else 'MARKS'
+    candidate = CandidateScore.objects.select_related('slot').filter(user=request.user).first()
+
+    if params.get('department'):
+        scope, key = 'DEPARTMENT', params.get('department')
+    elif params.get('slot_id'):
+        scope, key = 'SLOT', params.get('slot_id')
+    elif candidate:
+        scope, key = 'SLOT', candidate.slot_id
+    else:
+        scope, key = None, None
+
     try:
+        if params.get('value') not in (None, ''):
+            value = float(params.get('value'))
+        elif candidate:
+            value = candidate.normalized_marks if field == 'NORMALIZED' else candidate.marks_obtained
+        else:
+            value = None
+    except ValueError:
+        value = None
+
+    if scope is None or value is None:
+        return Response({
+            "status": 400,
+            "message": "No Data Found",
+            "error": "Please give a slot_id or department and a numeric value",
+            "success": False
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    histogram = get_score_histogram(scope, key, field)
+
+    if histogram is None or not histogram.total:
+        return Response({
+            "status": 404,
+            "message": "No Data Found",
+            "error": "No scores found for the given slot or department",
+            "success": False
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    data = {
+        "status": 200,
+        "success": True,
+        "message": "Percentile calculated successfully",
+        "scope": scope,
+        "key": str(key),
+        "field": field,
+        "value": value,
+        "total": histogram.total,
+        "percentile": histogram_percentile(histogram, value),
+    }
+    if params.get('cdf') in ('1', 'true', 'True'):
+        data["bin_width"] = histogram.bin_width
+        data["cdf"] = histogram_cdf(histogram)
+
+    return Response(data, status=status.HTTP_200_OK)
+
+
+class PredictRankJobApi(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Queue a predictRank run and return its job id right away.
+        """
         url = request.data.get("url")
         department = request.data.get("department")
         shift = request.data.get("shift")
@@ -203,56 +425,111 @@ def predictRank(request):
                 "success": False
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Get slot object
-        try:
-            filters = {"department": department}
-
-            if shift:
-                filters["shift"] = shift
+        job = enqueue_job('PREDICT', {"url": url, "department": department, "shift": shift}, user=request.user)
 
-            slot = Slots.objects.get(**filters)
+        return Response({
+            "status": 202,
+            "message": "Rank prediction queued",
+            "job_id": str(job.id),
+            "job_status": job.status,
+            "success": True
+        }, status=status.HTTP_202_ACCEPTED)
 
-            print(slot)
+    def get(self, request):
+        """
+        Status of a queued prediction or answer key re-score; includes the
+        result once finished and the progress of a running re-score.
+        """
+        job_id = request.query_params.get('id')
 
-        except Slots.DoesNotExist:
+        try:
+            job = BackgroundJob.objects.get(id=job_id, user=request.user)
+        except (BackgroundJob.DoesNotExist, ValueError, DjangoValidationError):
             return Response({
                 "status": 404,
                 "message": "No Data Found",
-                "error": "No data found for the given slot",
+                "error": "No job found for the given id",
                 "success": False
             }, status=status.HTTP_404_NOT_FOUND)
 
-        # Scrape data from the URL
-        try:
-            scraped_data = get_candidate_response(url)  # Replace with your scraping function
-            # return Response({
-            #     "data":scraped_data
-            # })
-        except Exception as e:
+        return Response({
+            "status": 200,
+            "message": "Job status retrieved successfully",
+            "job_id": str(job.id),
+            "job_status": job.status,
+            "kind": job.kind,
+            "progress": job.progress,
+            "result": job.result,
+            "error": job.error,
+            "success": True
+        }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def performanceMetrics(request):
+    """
+    Request, query and pipeline stage timing histograms of this worker
+    process (see instrumentation.py). DELETE clears them.
+    """
+    if request.method == 'DELETE':
+        reset_metrics()
+        return Response({
+            "status": 200,
+            "message": "Metrics cleared",
+            "success": True
+        }, status=status.HTTP_200_OK)
+
+    return Response({
+        "status": 200,
+        "message": "Metrics retrieved successfully",
+        "data": get_metrics(),
+        "success": True
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batchScore(request):
+    """
+    Score many response sheets for one slot in a single request.
+    Sheets are fetched concurrently, then scored together in one vectorized pass.
+    Only urls on the SHEET_URL_HOSTS are fetched. Nothing is stored in CandidateScore.
+    """
+    try:
+        urls = request.data.get("urls")
+        department = request.data.get("department")
+        shift = request.data.get("shift")
+
+        if not department or not urls or not isinstance(urls, list):
             return Response({
                 "status": 400,
-                "message": "Failed to scrape data",
-                "error": str(e),
+                "message": "No Data Found",
+                "error": "Please provide department and a list of urls",
                 "success": False
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Validate scraped data format
-        if not isinstance(scraped_data, list) or not all(
-            isinstance(item, dict) and "question_no" in item and "q_type" in item and "question_Id" in item and "candidate_answer" in item
-            for item in scraped_data
-        ):
+        max_urls = getattr(settings, 'BATCH_SCORE_MAX_URLS', 500)
+        if len(urls) > max_urls:
             return Response({
                 "status": 400,
-                "message": "Invalid scraped data format",
-                "error": "Scraped data must be a list of dictionaries with keys: question_no, q_type, candidate_answer",
-                "success": False,
-                "data":scraped_data
+                "message": "Too many urls",
+                "error": f"At most {max_urls} urls can be scored in one request",
+                "success": False
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Fetch the correct answers from AnswerSheet
-        answer_sheets = AnswerSheet.objects.filter(slot=slot)
+        try:
+            slot, answer_key = resolve_slot(department, shift)
+
+        except Slots.DoesNotExist:
+            return Response({
+                "status": 404,
+                "message": "No Data Found",
+                "error": "No data found for the given slot",
+                "success": False
+            }, status=status.HTTP_404_NOT_FOUND)
 
-        if not answer_sheets.exists():
+        if not answer_key:
             return Response({
                 "status": 404,
                 "message": "No AnswerSheet Data Found",
@@ -260,126 +537,55 @@ def predictRank(request):
                 "success": False
             }, status=status.HTTP_404_NOT_FOUND)
 
-        # Convert AnswerSheet data to a dictionary {question_Id: (correct_answer, marks, q_type)}
-        answer_key = {
-            sheet.question_Id: (sheet.answer.strip(), sheet.mark, sheet.q_type, sheet.question_no) for sheet in answer_sheets
-        }
-
-        # Calculate marks
-        total_marks = 0
-        detailed_results = []
-
-        for user_response in scraped_data:
-            question_Id = int(user_response['question_Id'])
-            q_type = user_response['q_type']
-            # candidate_answer = user_response['candidate_answer'].strip().replace(" ", "")
-            candidate_answer = user_response['candidate_answer']
-
-            if question_Id in answer_key:
-                correct_answer, mark, q_type_db, question_no = answer_key[question_Id]
-                is_correct = False
-                marks_awarded = 0
-
-                if correct_answer == 'MTA':  # Free marks if attempted
-                    is_correct = True
-                    marks_awarded = mark
-                elif q_type_db == 'MCQ':  # Single correct option (Case insensitive)
-                    is_correct = candidate_answer.lower() == correct_answer.lower()
-                    marks_awarded = mark if is_correct else - (mark / 3)  # Deduct 1/3 for incorrect answer
-
-                elif q_type_db == 'MSQ':  # Multiple correct options (Case insensitive)
-                    
-                    try:
-                        correct_options = set(ast.literal_eval(correct_answer))  # Convert string to list then to set
-                    except (SyntaxError, ValueError):
-                        correct_options = set(correct_answer.strip("[]").split(","))  # Convert string to list and then to set
-                    user_options = set(candidate_answer)  # Convert list to set
-
-                    is_correct = correct_options == user_options  # Exact match required
-                    marks_awarded = mark if is_correct else 0
-
-                    # correct_options = set(correct_answer.replace(" ", "").lower().split(','))
-                    # user_options = set(candidate_answer.replace(" ", "").lower().split(','))
-                    # is_correct = correct_options == user_options  # Exact match required
-                    # marks_awarded = mark if is_correct else 0
-
-                elif q_type_db == 'NAT':  # Numeric answer type (No negative marking)
-                    try:
-                        candidate_answer_float = float(candidate_answer)
-                        is_correct = False
-                        # Split the correct answer by 'OR' to handle multiple ranges
-                        ranges = correct_answer.replace(" ", "").split('OR')
-                        for range_str in ranges:
-                            range_str = range_str.strip()
-                            if 'to' in range_str:
-                                lower_bound, upper_bound = map(float, range_str.split('to'))
-                                if lower_bound <= candidate_answer_float <= upper_bound:
-                                    is_correct = True
-                                    break  # Answer is in range
-                            elif float(range_str) == candidate_answer_float:
-                                is_correct = True
-                                break
-                    except ValueError:
-                        is_correct = False
-                    marks_awarded = mark if is_correct else 0
-
-                total_marks += marks_awarded
-
-                detailed_results.append({
-                    "question_no": question_no,
-                    "question_Id": question_Id,
-                    "user_answer": candidate_answer,
-                    "correct_answer": correct_answer,
-                    "is_correct": is_correct,
-                    "marks_awarded": marks_awarded
-                })
-
-        candidate, created = CandidateScore.objects.update_or_create(
-            user=request.user,
-            slot=slot,
-            defaults={
+        # Fetch every sheet concurrently, keeping failures per url instead of failing the batch
+        scored_urls = []
+        responses = []
+        errors = [
+            {"url": url, "error": "Not a response sheet url"}
+            for url in urls if not is_sheet_url(url)
+        ]
+        sheet_urls = [url for url in urls if is_sheet_url(url)]
+
+        for url, scraped_data in zip(sheet_urls, get_candidate_responses(sheet_urls)):
+            if isinstance(scraped_data, Exception):
+                errors.append({"url": url, "error": f"Failed to scrape data: {str(scraped_data)}"})
+                continue
+
+            if not is_valid_scraped_data(scraped_data):
+                errors.append({"url": url, "error": "Invalid scraped data format"})
+                continue
+
+            scored_urls.append(url)
+            responses.append(scraped_data)
+
+        batch = score_batch(answer_key, responses)
+
+        ranks = get_candidate_ranks(batch.totals, department)
+        rank_model = get_rank_model(department)
+
+        results = []
+        for row, url in enumerate(scored_urls):
+            question_results = batch.question_results(row)
+            total_marks = float(batch.totals[row])
+            results.append({
+                "url": url,
                 "marks_obtained": total_marks,
-                "sheet_url": url
-            }
-        )
-
-        normalized_mark=calculate_normalized_marks(candidate)
-        candidate.normalized_marks=normalized_mark
-        candidate.save()
-
-        gate_score=calculate_gate_score(candidate,normalized_mark)
-        rank = get_candidate_rank(total_marks, department)
-
-        candidate.gate_score=gate_score
-        candidate.rank=rank
-        candidate.save()
-
-
-        try:
-            calculate_normalized_rank(rank)
-            candidate.refresh_from_db()
-            normalized_rank=candidate.normalized_rank
-        except Exception as e:
-            print(e)
-            normalized_rank="unable to specify"
-
-
+                "rank": ranks[row],
+                "predicted_rank": rank_model.predict(total_marks),
+                "attempted": len(question_results),
+                "correct": int(batch.correct[row].sum()),
+                "question_results": question_results
+            })
 
         return Response({
             "status": 200,
             "success": True,
-            "message": "Marks calculated successfully",
-            "rank": rank,
-            "marks_obtained": total_marks,
-            "normalized_marks":candidate.normalized_marks,
-            "gate_score":candidate.gate_score,
-            "normalized_rank":normalized_rank,
-            "detailed_results": detailed_results
+            "message": f"{len(results)} response sheets scored successfully",
+            "results": results,
+            "errors": errors
         }, status=status.HTTP_200_OK)
 
     except Exception as e:
-        print("**************************************************")
-        print(e)
         return Response({
             "status": 500,
             "message": "An error occurred",
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "rankpredictor.middleware.PerformanceMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     'django.middleware.security.SecurityMiddleware',
@@ -93,9 +95,27 @@ if env('USE_POSTGRES',cast=bool):
             'USER': env('DB_USER'),
             'PASSWORD': env('DB_PASSWORD'),
             'HOST': env('DB_HOST'),
-            'PORT': env('DB_PORT')
+            'PORT': env('DB_PORT'),
+            'OPTIONS': {
+                'connect_timeout': env.int('DB_CONNECT_TIMEOUT', default=10),
+            },
+            # pgbouncer in transaction mode cannot keep a server side cursor
+            # (QuerySet.iterator) open across statements
+            'DISABLE_SERVER_SIDE_CURSORS': env.bool('DB_PGBOUNCER', default=False),
         }
     }
+    if env.bool('DB_POOL', default=False):
+        # Django's native connection pool, needs psycopg 3 (requirements.txt only has psycopg2)
+        try:
+            import psycopg  # noqa: F401
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            raise ImproperlyConfigured('DB_POOL needs psycopg 3 and its pool: pip install "psycopg[binary,pool]"')
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+            'timeout': env.int('DB_POOL_TIMEOUT', default=10),
+        }
 else:
     DATABASES = {
         'default': {
@@ -104,6 +124,36 @@ else:
         }
     }
 
+# Persistent connections: seconds a connection is reused by the following
+# requests of a worker (0 opens a new one per request). A pooled connection
+# goes back to the pool after each request instead, so this must stay 0.
+DATABASES['default']['CONN_MAX_AGE'] = 0 if 'pool' in DATABASES['default'].get('OPTIONS', {}) else env.int('DB_CONN_MAX_AGE', default=60)
+# Check a reused connection is still alive before the first query of a request
+DATABASES['default']['CONN_HEALTH_CHECKS'] = env.bool('DB_CONN_HEALTH_CHECKS', default=True)
+
+# Read replica for the rankpredictor read endpoints (see rankpredictor/db_router.py).
+# PostgreSQL: DB_REPLICA_HOST / DB_REPLICA_PORT, with the primary's credentials.
+# SQLite: DB_REPLICA_NAME, a second database file (copy db.sqlite3 to it to try the routing locally).
+REPLICA_DATABASE = None
+if env('USE_POSTGRES',cast=bool) and env('DB_REPLICA_HOST', default=''):
+    REPLICA_DATABASE = 'replica'
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES['default'],
+        'HOST': env('DB_REPLICA_HOST'),
+        'PORT': env('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+    }
+elif not env('USE_POSTGRES',cast=bool) and env('DB_REPLICA_NAME', default=''):
+    REPLICA_DATABASE = 'replica'
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / env('DB_REPLICA_NAME'),
+    }
+if REPLICA_DATABASE:
+    # Tests run against the primary only
+    DATABASES[REPLICA_DATABASE]['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['rankpredictor.db_router.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -159,6 +209,72 @@ REST_FRAMEWORK = {
 }
 
 
+# Rank predictor
+# Seconds a compiled answer key stays cached in a worker process
+ANSWER_KEY_CACHE_TTL = env.int('ANSWER_KEY_CACHE_TTL', default=60)
+# Seconds the in-memory (department, shift) -> slot registry is kept by a worker process
+SLOT_REGISTRY_TTL = env.int('SLOT_REGISTRY_TTL', default=60)
+# Most response sheet urls accepted by one batch scoring request
+BATCH_SCORE_MAX_URLS = env.int('BATCH_SCORE_MAX_URLS', default=500)
+# Answer key rows inserted per query while a CSV upload is streamed in
+ANSWER_SHEET_BATCH_SIZE = env.int('ANSWER_SHEET_BATCH_SIZE', default=500)
+
+# Response sheet downloads (shared keep-alive session, see rankpredictor/fetcher.py)
+SHEET_FETCH_CONNECT_TIMEOUT = env.float('SHEET_FETCH_CONNECT_TIMEOUT', default=5)
+SHEET_FETCH_READ_TIMEOUT = env.float('SHEET_FETCH_READ_TIMEOUT', default=20)
+SHEET_FETCH_RETRIES = env.int('SHEET_FETCH_RETRIES', default=3)
+SHEET_FETCH_BACKOFF = env.float('SHEET_FETCH_BACKOFF', default=0.5)
+SHEET_FETCH_POOL_SIZE = env.int('SHEET_FETCH_POOL_SIZE', default=20)
+SHEET_FETCH_CONCURRENCY = env.int('SHEET_FETCH_CONCURRENCY', default=10)
+# Hosts batch scoring fetches response sheets from, any other url is rejected
+SHEET_URL_HOSTS = env.list('SHEET_URL_HOSTS', default=['cdn.digialm.com'])
+
+# Cache of downloaded and parsed response sheets (see rankpredictor/sheet_cache.py).
+# BACKEND may be DiskSheetCache (LOCATION is a directory), MemorySheetCache or
+# DjangoSheetCache (LOCATION is a CACHES alias).
+SHEET_CACHE = {
+    'BACKEND': env('SHEET_CACHE_BACKEND', default='rankpredictor.sheet_cache.DiskSheetCache'),
+    'LOCATION': env('SHEET_CACHE_LOCATION', default=os.path.join(BASE_DIR, 'sheet_cache')),
+    'MAX_BYTES': env.int('SHEET_CACHE_MAX_BYTES', default=512 * 1024 * 1024),
+}
+# Seconds a cached sheet is served without revalidating it with the CDN
+SHEET_CACHE_FRESH_SECONDS = env.int('SHEET_CACHE_FRESH_SECONDS', default=6 * 60 * 60)
+
+# Background jobs (see rankpredictor/jobs.py). 'thread' runs jobs on a pool in
+# the web process, 'db' leaves them queued for `manage.py run_jobs` workers.
+JOB_QUEUE_BACKEND = env('JOB_QUEUE_BACKEND', default='thread')
+JOB_WORKERS = env.int('JOB_WORKERS', default=4)
+# Candidates re-scored per transaction after an answer key upload
+RESCORE_CHUNK_SIZE = env.int('RESCORE_CHUNK_SIZE', default=1000)
+# Cache used for rendered API responses (see rankpredictor/response_cache.py).
+# Point CACHE_URL at a shared cache (e.g. redis://) so every worker sees version bumps.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=60 * 60)
+# Seconds a response version lives, the longest a worker serves a response after
+# another process changed it. 0 keeps versions until the next write (shared cache only)
+RESPONSE_VERSION_TTL = env.int('RESPONSE_VERSION_TTL', default=60)
+
+# Age in seconds after which reading a slot's stored question analytics queues
+# a rebuild (see rankpredictor/analytics.py)
+ANALYTICS_CACHE_TTL = env.int('ANALYTICS_CACHE_TTL', default=5 * 60)
+
+# Extra entries kept in each department's topper heap beyond the top 0.1%,
+# so removals rarely force a reload from the table
+TOPPER_INDEX_SLACK = env.int('TOPPER_INDEX_SLACK', default=50)
+
+# Marks -> rank curves (see rankpredictor/rank_model.py): seconds before a
+# department's curve is rebuilt from the stored scores, and the number of
+# stored scores at which they weigh as much as the static table
+RANK_MODEL_TTL = env.int('RANK_MODEL_TTL', default=15 * 60)
+RANK_MODEL_PRIOR_STRENGTH = env.int('RANK_MODEL_PRIOR_STRENGTH', default=500)
+
+# Send per request timings (total, database, pipeline stages) in a
+# Server-Timing header to staff users, see rankpredictor/middleware.py
+SERVER_TIMING_HEADER = env.bool('SERVER_TIMING_HEADER', default=False)
+
+
 # MEDIA_URL = '/media/'  #this is for development only
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 